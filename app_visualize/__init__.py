@@ -1,12 +1,14 @@
-from pathlib import Path
 from utils.paths import get_visualization_folder
 import flask
 
 app = flask.Flask(__name__)
 
 app.config['SECRET_KEY'] = '7wVqacgKTB'
-app.config['MAX_CONTENT_LENGTH'] = 64 * 1024 * 1024
-app.config['UPLOAD_EXTENSIONS'] = ['xlsx', 'xls']
-app.config['UPLOAD_PATH'] = get_visualization_folder() / "data"
-app.config['UPLOADED_FILE_NAME'] = ""
+app.config['MAX_CONTENT_LENGTH'] = 512 * 1024 * 1024
+app.config['UPLOAD_EXTENSIONS'] = ['xlsx', 'xls', 'csv', 'csv.gz', 'parquet']
+app.config['UPLOAD_PATH'] = get_visualization_folder() / "data" / "uploads"
+app.config['UPLOAD_PATH'].mkdir(parents=True, exist_ok=True)
+app.config['UPLOAD_QUOTA'] = 2 * 1024 * 1024 * 1024
+# With PROFILE_REQUESTS on, requests sent with ?profile=1 are run under cProfile and dumped to data/profiles.
+app.config['PROFILE_REQUESTS'] = False
 
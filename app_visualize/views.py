@@ -1,25 +1,67 @@
-from pathlib import Path
 from datetime import datetime
-import json
-from flask import Flask, render_template, request, redirect, abort, url_for, flash, session
+import cProfile, json, time
+from flask import render_template, request, redirect, abort, url_for, flash, session, jsonify, make_response, send_from_directory, g
 from werkzeug.utils import secure_filename
 from . import app
 
-from utils.paths import get_root_folder, get_visualization_folder, get_data_folder
+from utils.paths import get_chart_cache_folder, get_registry_path, get_lock_folder, get_jobs_path, get_image_cache_folder, get_profile_folder, get_summary_folder
 from visualization.ProcessData import ProcessData
-from visualization.VisualizeData import VisualizeData, save_as_json
+from visualization.VisualizeData import VisualizeData, encode_json
+from visualization.PlanGraphs import PlanGraphs
+from visualization.ChartCache import ChartCache
+from visualization.ChartPayloads import ChartPayloads
+from visualization.DatasetRegistry import DatasetRegistry
+from visualization.JobQueue import JobQueue
+from visualization.RenderImages import RenderImages
+from visualization.CrossFilter import CrossFilter
+from visualization.DatasetSummaries import DatasetSummaries
+from visualization.ReadChunks import TypedChunks
+from visualization import Metrics
 
 # IMAGES_DIR = Path(Path(app.static_folder).joinpath("images"))
-JSON_FILES_DIR = Path(Path(app.static_folder).joinpath("json"))
 
 
+@app.before_request
+def start_timings():
+    g.request_start = time.perf_counter()
+    Metrics.start_request()
+    if app.config.get("PROFILE_REQUESTS") and request.args.get("profile"):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def add_timings(response):
+    # Server-Timing carries the per-stage breakdown of this request, the profile dump is named in X-Profile.
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        get_profile_folder().mkdir(parents=True, exist_ok=True)
+        profile_file = get_profile_folder() / "{0}_{1}.prof".format(datetime.now().strftime("%Y%m%d_%H%M%S_%f"), request.endpoint)
+        profiler.dump_stats(profile_file)
+        response.headers["X-Profile"] = profile_file.name
+    timings = Metrics.request_timings()
+    if "request_start" in g:
+        timings["total"] = time.perf_counter() - g.request_start
+    response.headers["Server-Timing"] = Metrics.server_timing(timings)
+    return response
+
+@app.route("/metrics")
+def metrics():
+    body, content_type = Metrics.latest()
+    response = make_response(body)
+    response.headers["Content-Type"] = content_type
+    return response
+
 def is_extension_valid(file_name):
-    return "." in file_name and file_name.rsplit(".",1)[1].lower() in app.config["UPLOAD_EXTENSIONS"]
+    return any(file_name.lower().endswith("." + extension) for extension in app.config["UPLOAD_EXTENSIONS"])
+
+def dataset_file_and_types(dataset, column_types=None):
+    return {"types": dataset.get("types") if column_types is None else column_types, "file_name": dataset.get("file_name"),
+            "sheet_name": registry.get_artifact(dataset.get("dataset_id"), "sheet_name")}
 
 @app.route("/")
 @app.route("/upload/", methods=["GET", "POST"])
 def upload_file():
-    session["file_name"] = ""
     if request.method == "POST":
         if "file" not in request.files:
             flash("No File Part")
@@ -29,13 +71,30 @@ def upload_file():
             flash("No File Selected")
             return redirect(request.url)
         if not is_extension_valid(file.filename):
-            flash("Only xlsx and xls formats.")
+            flash("Only {0} formats.".format(", ".join(app.config["UPLOAD_EXTENSIONS"])))
             return redirect(request.url)
         if file and is_extension_valid(file.filename):
+            # Every upload is its own dataset, two users uploading the same file name do not overwrite each other.
+            # A workbook's sheet is picked by name, the first sheet when none is given.
             file_name = secure_filename(file.filename)
-            file.save(app.config['UPLOAD_PATH'].joinpath(file_name))
-            app.config['UPLOADED_FILE_NAME'] = file_name
-            flash("File Saved Succesfully. {0}".format(app.config['UPLOADED_FILE_NAME']))
+            sheet_name = request.form.get("sheet", "").strip() or None
+            dataset_id = registry.new_id()
+            file_path = app.config['UPLOAD_PATH'].joinpath("{0}_{1}".format(dataset_id, file_name))
+            with registry.write_lock(dataset_id):
+                file.save(file_path)
+                try:
+                    content_hash = process.store_file(file_path, sheet_name)
+                except Exception as error:
+                    file_path.unlink(missing_ok=True)
+                    flash("Could not read {0}. Detail: {1}".format(file_name, error))
+                    return redirect(request.url)
+                registry.register(dataset_id, file_name, file_path, content_hash)
+                if sheet_name is not None:
+                    registry.set_artifact(dataset_id, "sheet_name", sheet_name)
+            session["dataset_id"] = dataset_id
+            session.pop("charts", None)
+            registry.evict(on_evict=forget_dataset)
+            flash("File Saved Succesfully. {0}".format(file_name))
             return redirect(request.url)
         
     return render_template("upload_file.html")
@@ -43,160 +102,221 @@ def upload_file():
 @app.route("/select-types/", methods=["GET", "POST"])
 def select_types():
     column_names = []
-    if request.method == "GET" and app.config['UPLOADED_FILE_NAME']:
-        file_path = get_data_folder() / app.config["UPLOADED_FILE_NAME"]
-        df = process.read_file(file_path)
-        column_names = df.columns.to_list()
-    if request.method == "POST":
-        # Take the user-defined datatypes and save it as {"types":{"col_name":"type",...}, "file_name":"..xlsx"}
+    suggested_types = {}
+    dataset = registry.get(session.get("dataset_id"))
+    if request.method == "GET" and dataset:
+        with registry.read_lock(dataset.get("dataset_id")):
+            sample = process.read_sample(dataset.get("file_path"), sheet_name=dataset_file_and_types(dataset).get("sheet_name"))
+        column_names = sample.columns.to_list()
+        suggested_types = process.suggest_datatypes(sample)
+    if request.method == "POST" and dataset:
+        # Take the user-defined datatypes and save them in the registry as {"col_name":"type",...}
         column_types = request.form.to_dict(flat=True)
-        user_file_and_types = {"types": column_types, "file_name": app.config['UPLOADED_FILE_NAME']}
-        save_as_json(user_file_and_types, JSON_FILES_DIR, "user_file_and_types")
-        # Apply the user-defined datatypes to the file, check if it raises an error.
-        file_path = get_data_folder() / app.config["UPLOADED_FILE_NAME"]
-        df = process.read_file(file_path)
-        df_copy = process.cast_datatypes(df, user_file_and_types)
+        user_file_and_types = dataset_file_and_types(dataset, column_types)
+        # Apply the user-defined datatypes to a sample of the file, check if it raises an error.
+        with registry.read_lock(dataset.get("dataset_id")):
+            sample = process.read_sample(dataset.get("file_path"), sheet_name=user_file_and_types.get("sheet_name"))
+        errors = process.check_datatypes(sample, user_file_and_types)
+        for error in errors.values():
+            flash(error)
+        if not errors:
+            registry.set_types(dataset.get("dataset_id"), column_types)
         return render_template("select_types.html", column_names=column_names, column_types=column_types)
     
-    return render_template("select_types.html", column_names=column_names)
+    return render_template("select_types.html", column_names=column_names, suggested_types=suggested_types)
 
 @app.route("/visualize/", methods=["GET","POST"])
 def visualize():
-    try:
-        with open(JSON_FILES_DIR / "user_file_and_types.json", "r") as file:
-            user_file_and_types = json.load(file)
-        app.config["UPLOADED_FILE_NAME"] = user_file_and_types.get("file_name")
-    except:
+    dataset = registry.get(session.get("dataset_id"))
+    if dataset is None or dataset.get("types") is None:
         return "No such file"
+    user_file_and_types = dataset_file_and_types(dataset)
+
+    if request.method == "POST":
+        graph_types = request.form.to_dict(flat=True).get("types")
+        if request.form.get("mode") == "async":
+            # Long analyses run on the job queue, the client polls /api/jobs/<job_id>/ for the charts.
+            try:
+                graph_types_list = json.loads(graph_types)
+            except (TypeError, ValueError):
+                return "invalid input"
+            job_id = jobs.submit(dataset.get("dataset_id"), graph_types_list, chart_job(dataset, user_file_and_types, graph_types_list))
+            return jsonify({"job_id": job_id, "status_url": url_for("job_status", job_id=job_id)}), 202
+        try:
+            graph_types_list = json.loads(graph_types)
+            with registry.read_lock(dataset.get("dataset_id")):
+                file_path = dataset.get("file_path")
+                # Charts are listed by their position in the graph list like in the job API, two graphs of one
+                # type share a json name.
+                charts = []
+                for position, json_name, key, payload in prepare_charts(file_path, user_file_and_types, graph_types_list):
+                    if chart_payloads.get(key) is None:
+                        chart_payloads.put(key, payload, json_name)
+                    charts.append({"position": position, "json_name": json_name, "key": key})
+            session["charts"] = charts
+        except:
+            return "invalid input"
+    return render_template("visualize.html", user_file_and_types=user_file_and_types, charts=session.get("charts", []))
+
+def prepare_charts(file_path, user_file_and_types, graph_types_list, on_chart=None, cancelled=None):
+    # Charts already prepared for this file content, type mapping and graph spec come from the cache,
+    # pandas only runs for the rest. on_chart(index, key, chart) is called as each chart becomes available.
+    sheet_name = user_file_and_types.get("sheet_name")
+    dataset_hash = process.dataset_hash(file_path, sheet_name)
+    keys = [chart_cache.key(dataset_hash, user_file_and_types.get("types"), graph) for graph in graph_types_list]
+    charts = [chart_cache.get(key) for key in keys]
+    missing = [index for index, chart in enumerate(charts) if chart is None]
+    if on_chart is not None:
+        for index, chart in enumerate(charts):
+            if chart is not None:
+                on_chart(index, keys[index], chart)
+    if missing:
+        missing_graphs = [graph_types_list[index] for index in missing]
+        columns = process.required_columns(missing_graphs, user_file_and_types)
+        # Mergeable intermediates are folded over chunks of the stored rows. The typed frame is only read
+        # whole when a graph needs the rows themselves (scatter, box, time plots, medians), every chart is
+        # then prepared from it and the rows are not read a second time chunk by chunk.
+        chunks = TypedChunks(process, file_path, user_file_and_types, columns)
+        df_typed = chunks.head()
+        if planner.needs_rows(df_typed, missing_graphs):
+            df_typed = process.cast_datatypes(process.read_file(file_path, sheet_name, columns), user_file_and_types, columns)
+            chunks = None
 
+        def chart_done(position, chart):
+            # Graphs that do not fit the columns are cached too, as an entry without a json name.
+            index = missing[position]
+            json_name, payload = chart if chart is not None else (None, None)
+            charts[index] = {"json_name": json_name, "payload": payload}
+            chart_cache.put(keys[index], charts[index])
+            if on_chart is not None:
+                on_chart(index, keys[index], charts[index])
+        # An upload that appends rows to an earlier one only summarizes the new rows for the mergeable charts.
+        planner.run(df_typed, missing_graphs, dataset_hash, on_chart=chart_done, cancelled=cancelled,
+                    column_types=user_file_and_types.get("types"), base=process.dataset_base(file_path, sheet_name), chunks=chunks)
+    return [(position, chart.get("json_name"), key, chart.get("payload")) for position, (key, chart) in enumerate(zip(keys, charts)) if chart is not None and chart.get("json_name")]
+
+def chart_job(dataset, user_file_and_types, graph_types_list):
+    def work(job_id, on_chart, cancelled):
+        with registry.read_lock(dataset.get("dataset_id")):
+            prepare_charts(dataset.get("file_path"), user_file_and_types, graph_types_list,
+                           on_chart=lambda index, key, chart: on_chart(index, chart.get("json_name"), key), cancelled=cancelled)
+    return work
+
+def forget_dataset(dataset_id, content_hash):
+    if not registry.hash_in_use(content_hash):
+        chart_cache.invalidate(content_hash)
+        renderer.invalidate(content_hash)
+        crossfilter.invalidate(content_hash)
+
+@app.route("/api/charts/<int:position>/")
+def chart_data(position):
+    chart = next((chart for chart in session.get("charts", []) if chart.get("position") == position), None)
+    if chart is None:
+        abort(404)
+    return chart_response(chart.get("key"))
+
+def chart_response(key):
+    # Payload of a prepared chart, gzipped when the client accepts it and answered with 304 when the
+    # client's ETag still matches.
+    entry = chart_payloads.get(key)
+    if entry is None:
+        chart = chart_cache.get(key)
+        if chart is None:
+            abort(404)
+        entry = chart_payloads.put(key, chart.get("payload"), chart.get("json_name"))
+    if "gzip" in request.accept_encodings:
+        response = make_response(entry.get("gzip"))
+        response.headers["Content-Encoding"] = "gzip"
+        response.set_etag("{0}-gzip".format(entry.get("etag")))
+    else:
+        response = make_response(entry.get("body"))
+        response.set_etag(entry.get("etag"))
+    response.mimetype = "application/json"
+    response.vary.add("Accept-Encoding")
+    return response.make_conditional(request)
+
+def session_job(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.get("dataset_id") != session.get("dataset_id"):
+        abort(404)
+    return job
+
+@app.route("/api/jobs/<job_id>/")
+def job_status(job_id):
+    # Progress of a background job, with a url for every chart that is already finished.
+    job = session_job(job_id)
+    charts = [{"position": chart.get("position"), "type": chart.get("graph").get("type"), "status": chart.get("status"), "json_name": chart.get("json_name"),
+               "url": url_for("job_chart_data", job_id=job_id, position=chart.get("position")) if chart.get("status") == "done" else None}
+              for chart in job.get("charts")]
+    return jsonify({"job_id": job_id, "status": job.get("status"), "error": job.get("error"), "progress": job.get("progress"), "charts": charts})
+
+@app.route("/api/jobs/<job_id>/charts/<int:position>/")
+def job_chart_data(job_id, position):
+    job = session_job(job_id)
+    chart = next((chart for chart in job.get("charts") if chart.get("position") == position), None)
+    if chart is None or chart.get("status") != "done":
+        abort(404)
+    return chart_response(chart.get("chart_key"))
+
+@app.route("/api/jobs/<job_id>/cancel/", methods=["POST"])
+def cancel_job(job_id):
+    session_job(job_id)
+    jobs.cancel(job_id)
+    return job_status(job_id)
+
+@app.route("/api/query/", methods=["POST"])
+def query():
+    # Drill-down: the charts of the graph specs over the rows that match every filter, e.g.
+    # {"filters": [{"column": "Sex", "values": ["female"]}, {"column": "Date", "min": "2020-01-01"}], "graphs": [...]}.
+    # The typed frame and its indexes stay in memory, a query only selects rows and prepares the charts.
+    dataset = registry.get(session.get("dataset_id"))
+    if dataset is None or dataset.get("types") is None:
+        abort(404)
+    body = request.get_json(silent=True) or {}
+    filters, graph_types_list = body.get("filters", []), body.get("graphs", [])
+    if not isinstance(filters, list) or not isinstance(graph_types_list, list):
+        return jsonify({"error": "filters and graphs must be lists"}), 400
+    user_file_and_types = dataset_file_and_types(dataset)
+    try:
+        with registry.read_lock(dataset.get("dataset_id")):
+            df_filtered = crossfilter.query(dataset.get("file_path"), user_file_and_types, filters)
+    except (ValueError, TypeError) as error:
+        return jsonify({"error": str(error)}), 400
+    charts = planner.run(df_filtered, graph_types_list)
+    result = {"rows": len(df_filtered), "charts": [None if chart is None else {"json_name": chart[0], "payload": chart[1]} for chart in charts]}
+    response = make_response(encode_json(result))
+    response.mimetype = "application/json"
+    return response
+
+@app.route("/api/cache-stats/")
+def cache_stats():
+    return jsonify(chart_cache.stats())
+
+@app.route("/visualize/plot/", methods=["GET", "POST"])
+def plot():
+    # Static export: the same graph specs as /visualize/, rendered to png or pdf files on the render pool.
+    dataset = registry.get(session.get("dataset_id"))
+    if dataset is None or dataset.get("types") is None:
+        return "No such file"
+    column_types = dataset.get("types")
     if request.method == "POST":
         graph_types = request.form.to_dict(flat=True).get("types")
+        image_format = request.form.get("format", "png")
         try:
             graph_types_list = json.loads(graph_types)
-            if app.config["UPLOADED_FILE_NAME"]:
-                file_path = get_data_folder() / app.config["UPLOADED_FILE_NAME"]
-                df = process.read_file(file_path)
-                df_copy = process.cast_datatypes(df, user_file_and_types)
-                df_categoric = process.process_categorical(df_copy)
-                df_numeric = process.process_numeric(df_copy)
-                df_datetime = process.process_datetime(df_copy)
-                text_processed_by_cols = process.process_text(df_copy)
-            
-            for graph in graph_types_list:
-                if (graph.get("type") == "pieplot"):
-                    if (graph.get("categoric_col_name") in df_categoric.columns):
-                        category_counts = visualizer.prepare_pieplot(df_categoric, graph.get("categoric_col_name"))
-                        save_as_json(category_counts, JSON_FILES_DIR, "data_pieplot")
-                elif (graph.get("type") == "barplot"):
-                    if (graph.get("categoric_col_name") in df_categoric.columns):
-                        if graph.get("numeric_col_name") in df_numeric.columns:
-                            data_barplot = visualizer.prepare_barplot(df_copy, graph.get("categoric_col_name"), graph.get("numeric_col_name"))
-                            save_as_json(data_barplot, JSON_FILES_DIR, "data_barplot_xy")
-                        elif not graph.get("numeric_col_name"):
-                            data_barplot = visualizer.prepare_barplot(df_copy, graph.get("categoric_col_name"))
-                            save_as_json(data_barplot, JSON_FILES_DIR, "data_barplot_x")
-                    else:
-                        label_counts = visualizer.prepare_barplot(df_categoric, graph.get("x"))
-                        save_as_json(label_counts, JSON_FILES_DIR, "data_barplot_x")
-                elif (graph.get("type") == "scatterplot"):
-                    if (graph.get("num_col_name_1") in df_numeric.columns) and (graph.get("num_col_name_2") in df_numeric.columns):
-                        data_scatter = visualizer.prepare_scatterplot(df_copy, graph.get("num_col_name_1"), graph.get("num_col_name_2"))
-                        save_as_json(data_scatter, JSON_FILES_DIR, "data_scatter_xy")
-                elif graph.get("type") == "timeplot":
-                    if (graph.get("x") in df_datetime.columns) and (graph.get("y") in df_numeric.columns):
-                        data_timeplot = visualizer.prepare_timeplot(df_copy, graph.get("x"), graph.get("y"))
-                        save_as_json(data_timeplot, JSON_FILES_DIR, "data_timeplot_xy")
-                elif graph.get("type") == "boxplot":
-                    if graph.get("x") in df_numeric.columns:
-                        data_boxplot = visualizer.prepare_boxplot(df_numeric, graph.get("x"))
-                        save_as_json(data_boxplot, JSON_FILES_DIR, "data_boxplot_x")
-                elif graph.get("type") == "correlation":
-                        data_correlation = visualizer.prepare_correlation(df_numeric)
-                        save_as_json(data_correlation, JSON_FILES_DIR, "data_correlation")
-                elif graph.get("type") == "histogram":
-                    if graph.get("x") in df_numeric.columns:
-                        data_histogram = visualizer.prepare_histogram(df_numeric, graph.get("x"))
-                        save_as_json(data_histogram, JSON_FILES_DIR, "data_histogram_x")
-                elif graph.get("type") == "wordcloud":
-                    if graph.get("x") in text_processed_by_cols.keys():
-                        data_wordcloud = visualizer.prepare_wordcloud(text_processed_by_cols, graph.get("x"))
-                        save_as_json(data_wordcloud, JSON_FILES_DIR, "data_wordcloud_x")       
+            with registry.read_lock(dataset.get("dataset_id")):
+                user_file_and_types = dataset_file_and_types(dataset)
+                image_paths = renderer.render(dataset.get("file_path"), user_file_and_types, graph_types_list, image_format)
         except:
             return "invalid input"
-    return render_template("visualize.html", user_file_and_types=user_file_and_types)
-
-# @app.route("/visualize/plot/", methods=["GET", "POST"])
-# def plot():
-#     user_request = (
-#         # {"graph_type":"bar", "column_name":"STATE"}, 
-#         # {"graph_type":"pie", "column_name":"ACCOUNT_LENGTH"},
-#         # {"graph_type":"bar", "column_name":"NUMBER_CUSTOMER_SERVICE_CALLS"},
-#         # {"graph_type":"pie", "column_name":"CHURN"},
-#         # {"graph_type":"correlation"},
-#         # {"graph_type":"scatter", "x":"AGE", "y":"PRICE"},
-#         # {"graph_type":"histogram", "x":"AGE", "bins":50, "density":True},
-#         # {"graph_type":"histogram", "x":"PRICE", "bins":40, "density":False},
-#         # {"graph_type":"boxplot", "x":"AGE", "y":"PRICE"},
-#         # {"graph_type":"boxplot", "x":"AGE"},
-#         # {"graph_type":"timeseries", "x":"Date", "y1":"Deaths", "y2":"Recovered"},
-#         # {"graph_type":"timeseries", "x":"Date", "y1":"Confirmed"},
-#         # {"graph_type":"timeseries", "x":"Date", "y2":"Deaths"},
-#     )
-#     if request.method == "POST":
-#         print("PLOT FORM:", request.form.to_dict(flat=True))
-#         column_types = request.form.to_dict(flat=True)
-#         df = process.read_file(get_data_folder() / app.config["UPLOADED_FILE_NAME"])
-#         df_categoric = process.process_categorical(df)
-#         df_numeric = process.process_numeric(df)
-#         df_datetime = process.process_datetime(df)
-#         print("DF datetime DTYPE:", df_datetime.dtypes)
-#         print("DF datetime type:", type(df_datetime))
-#         for user_req in user_request:
-#             if user_req.get("graph_type") == "bar":
-#                 if user_req.get("column_name") in df_categoric.columns:
-#                     visualizer.plot_bar(df, user_req.get("column_name"))
-#                 else:
-#                     # TODO Bar plot only available for categoric columns
-#                     pass
-#             elif user_req.get("graph_type") == "pie":
-#                 if user_req.get("column_name") in df_categoric.columns:
-#                     visualizer.plot_pie(df, user_req.get("column_name"))
-#                 else:
-#                     # TODO Pie plot is only available for categoric columns
-#                     pass
-#             elif user_req.get("graph_type") == "correlation":
-#                 visualizer.plot_correlation(df_numeric)
-            
-#             elif user_req.get("graph_type") == "scatter":
-#                 if (user_req.get("x") in df_numeric.columns) and (user_req.get("y") in df_numeric.columns):
-#                     visualizer.plot_scatter(df_numeric, user_req.get("x"), user_req.get("y"))
-#                 else:
-#                     # TODO Scatter is only available for numeric columns
-#                     pass
-#             elif user_req.get("graph_type") == "histogram":
-#                 if user_req.get("x") in df_numeric.columns:
-#                     visualizer.plot_histogram(df_numeric, user_req.get("x"), user_req.get("bins"), user_req.get("density"))
-#                 else:
-#                     # TODO Histogram is only available for numeric columns
-#                     pass
-#             elif user_req.get("graph_type") == "boxplot":
-#                 if user_req.get("x") == df_datetime.name or user_req.get("y") == df_datetime.name: # Add df_datetime.columns
-#                     # TODO boxplot is only available for non_datetime type columns
-#                     pass
-#                 else:
-#                     visualizer.plot_boxplot(df, user_req.get("x"), user_req.get("y", -1))
-#             elif user_req.get("graph_type") == "timeseries":
-#                 if user_req.get("x") == df_datetime.name:
-#                     visualizer.plot_time(df, user_req.get("x"), user_req.get("y1", -1), user_req.get("y2", -1))
-#                 else:
-#                     #TODO the x column should be of type datetime
-#                     pass
-#     else:
-#         column_types = {}    
-       
-#     images_list = [child.name for child in IMAGES_DIR.iterdir()]
-#     return render_template('plot.html', images=images_list, column_types=column_types)
+        session["images"] = [image_path.name for image_path in image_paths if image_path is not None]
+    return render_template('plot.html', images=session.get("images", []), column_types=column_types)
 
+@app.route("/visualize/plot/images/<image_name>")
+def plot_image(image_name):
+    if image_name not in session.get("images", []):
+        abort(404)
+    return send_from_directory(get_image_cache_folder(), image_name, conditional=True)
 
 
 @app.route("/high-charts/")
@@ -209,3 +329,10 @@ def high_charts():
 
 process = ProcessData()
 visualizer = VisualizeData()
+planner = PlanGraphs(process, visualizer, summaries=DatasetSummaries(get_summary_folder()))
+chart_cache = ChartCache(get_chart_cache_folder())
+chart_payloads = ChartPayloads()
+renderer = RenderImages(process, get_image_cache_folder())
+crossfilter = CrossFilter(process)
+registry = DatasetRegistry(get_registry_path(), get_lock_folder(), app.config['UPLOAD_QUOTA'])
+jobs = JobQueue(get_jobs_path())
@@ -0,0 +1,228 @@
+import argparse, json, platform, statistics, subprocess, sys, tempfile, time, tracemalloc, warnings
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from utils.paths import get_data_folder, get_root_folder
+from visualization.DatasetStore import DatasetStore
+from visualization.ProcessData import ProcessData
+from visualization.VisualizeData import VisualizeData, encode_json
+
+
+BENCHMARKS_DIR = Path(__file__).parent
+
+# Column types and the columns every prepare_* stage runs on, per bundled dataset.
+DATASETS = {
+    "titanic.xlsx": {
+        "types": {"Survived": "categoric", "Pclass": "categoric", "Name": "text", "Sex": "categoric", "Age": "numeric",
+                  "Fare": "numeric", "TIMESTAMP": "numeric", "Date": "datetime", "text": "text"},
+        "categoric": "Pclass", "numeric": ("Age", "Fare"), "datetime": "Date", "text": "text",
+    },
+    "market_sales_small.xlsx": {
+        "types": {"ID": "numeric", "ITEMCODE": "categoric", "ITEMNAME": "text", "AMOUNT": "numeric", "PRICE": "numeric",
+                  "CLIENTNAME": "categoric", "BRAND": "categoric", "CATEGORY_NAME1": "categoric", "CATEGORY_NAME2": "categoric",
+                  "CATEGORY_NAME3": "categoric", "TIMESTAMP": "datetime"},
+        "categoric": "CATEGORY_NAME2", "numeric": ("AMOUNT", "PRICE"), "datetime": "TIMESTAMP", "text": "ITEMNAME",
+    },
+    "Intent_EN_large.xlsx": {
+        "types": {"text": "text", "label": "categoric"},
+        "categoric": "label", "numeric": (), "datetime": None, "text": "text",
+    },
+    "Somemto Yapay Zeka Sentiment.xlsx": {
+        "types": {"text": "text", "label": "categoric"},
+        "categoric": "label", "numeric": (), "datetime": None, "text": "text",
+    },
+}
+
+
+def scale_dataframe(dataframe, scale, column_types, seed=0):
+    # Bootstrap sample of scale * rows with a little noise on numeric and datetime columns, so scaled
+    # variants keep the value distributions but are not just the same rows repeated. Categories stay as they are.
+    if scale == 1:
+        return dataframe
+    rng = np.random.default_rng(seed)
+    scaled = dataframe.iloc[rng.integers(0, len(dataframe), len(dataframe) * scale)].reset_index(drop=True)
+    for name, dtype in scaled.dtypes.items():
+        if column_types.get(name) not in ("numeric", "datetime"):
+            continue
+        if pd.api.types.is_float_dtype(dtype):
+            scaled[name] = scaled[name] * rng.normal(1.0, 0.01, len(scaled))
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            scaled[name] = scaled[name] + pd.to_timedelta(rng.integers(-30 * 86400, 30 * 86400, len(scaled)), unit="s")
+    return scaled
+
+
+def measure(stage, repeat, trace_memory=True):
+    # Peak memory comes from a first run under tracemalloc (numpy and pandas buffers are traced, arrow
+    # buffers are not), wall time is the median of the following untraced runs.
+    peak_bytes = None
+    if trace_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        stage()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    timings = []
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        result = stage()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings), peak_bytes
+
+
+def benchmark_dataset(file_name, spec, scale, store_dir, repeat, trace_memory=True):
+    process = ProcessData(store_dir)
+    visualizer = VisualizeData()
+    results = {}
+
+    def record(stage_name, stage, payload=False):
+        result, seconds, peak_bytes = measure(stage, repeat, trace_memory)
+        results[stage_name] = {"seconds": seconds, "peak_bytes": peak_bytes, "payload_bytes": len(encode_json(result)) if payload else None}
+        return result
+
+    file_path = get_data_folder() / file_name
+    if scale == 1:
+        # The first read parses the workbook and writes the feather file, later reads come from the store.
+        start = time.perf_counter()
+        df = process.read_file(file_path)
+        results["read_file_cold"] = {"seconds": time.perf_counter() - start, "peak_bytes": None, "payload_bytes": None}
+    else:
+        # Scaled variants are past what is sensible (or possible) to write as xlsx, they go straight into the store
+        # under a small key file and read_file takes the same store path as for a stored upload.
+        file_path = Path(store_dir) / "{0}@{1}x.key".format(file_name, scale)
+        file_path.write_text("{0}@{1}x".format(file_name, scale))
+        df = scale_dataframe(pd.read_excel(get_data_folder() / file_name), scale, spec.get("types"))
+        start = time.perf_counter()
+        DatasetStore(store_dir).put(file_path, df)
+        results["store_put"] = {"seconds": time.perf_counter() - start, "peak_bytes": None, "payload_bytes": None}
+    rows = len(df)
+
+    df = record("read_file", lambda: process.read_file(file_path))
+    df_typed = record("cast_datatypes", lambda: process.cast_datatypes(df, {"types": spec.get("types")}))
+    df_categoric = process.process_categorical(df_typed)
+    df_numeric = process.process_numeric(df_typed)
+    cat_col, num_cols, datetime_col, text_col = spec.get("categoric"), spec.get("numeric"), spec.get("datetime"), spec.get("text")
+
+    text_dict = record("process_text", lambda: process.process_text(df_typed, [text_col]))
+    record("prepare_wordcloud", lambda: visualizer.prepare_wordcloud(text_dict, text_col), payload=True)
+    record("prepare_pieplot", lambda: visualizer.prepare_pieplot(df_categoric, cat_col), payload=True)
+    record("prepare_barplot_x", lambda: visualizer.prepare_barplot(df_categoric, cat_col), payload=True)
+    if num_cols:
+        record("prepare_barplot_xy", lambda: visualizer.prepare_barplot(df_typed, cat_col, num_cols[0]), payload=True)
+        record("prepare_scatterplot", lambda: visualizer.prepare_scatterplot(df_numeric, num_cols[0], num_cols[1]), payload=True)
+        record("prepare_boxplot", lambda: visualizer.prepare_boxplot(df_typed, list(num_cols), cat_col), payload=True)
+        record("prepare_correlation", lambda: visualizer.prepare_correlation(df_numeric), payload=True)
+        record("prepare_histogram", lambda: visualizer.prepare_histogram(df_numeric, num_cols[0], kde=True), payload=True)
+        if datetime_col:
+            record("prepare_timeplot", lambda: visualizer.prepare_timeplot(df_typed, datetime_col, num_cols[0]), payload=True)
+    process.text_processor().close()
+    return rows, results
+
+
+def run_variant(file_name, scale, store_dir, repeat, trace_memory):
+    # Every (dataset, scale) runs in its own interpreter: memory peaks do not carry over from the previous
+    # variant, and a variant killed for running out of memory is recorded as failed instead of ending the run.
+    with tempfile.NamedTemporaryFile(suffix=".json") as variant_output:
+        command = [sys.executable, "-m", "benchmarks.pipeline", "--variant", file_name, str(scale), "--store-dir", store_dir,
+                   "--repeat", str(repeat), "--variant-output", variant_output.name]
+        if not trace_memory:
+            command.append("--no-trace-memory")
+        completed = subprocess.run(command, cwd=get_root_folder())
+        if completed.returncode != 0:
+            return None, {"failed": {"error": "exit code {0}".format(completed.returncode)}}
+        variant = json.loads(Path(variant_output.name).read_text())
+    return variant.get("rows"), variant.get("stages")
+
+
+def compare(results, baseline, threshold, min_seconds, min_bytes):
+    # A stage regresses when its time or peak memory grows by more than threshold (relative) and by more than
+    # the absolute noise floor. A variant that failed now but not in the baseline is a regression too.
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if key.endswith("/failed"):
+            if previous is None:
+                regressions.append((key, current.get("error"), None, None))
+            continue
+        if previous is None:
+            continue
+        for metric, floor in (("seconds", min_seconds), ("peak_bytes", min_bytes)):
+            if current.get(metric) is None or previous.get(metric) is None:
+                continue
+            if current.get(metric) > previous.get(metric) * (1 + threshold) and current.get(metric) - previous.get(metric) > floor:
+                regressions.append((key, metric, previous.get(metric), current.get(metric)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark read, cast, text processing and chart payloads over the bundled datasets.")
+    parser.add_argument("--datasets", nargs="*", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--scales", nargs="*", type=int, default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=BENCHMARKS_DIR / "results" / "latest.json")
+    parser.add_argument("--baseline", type=Path, default=BENCHMARKS_DIR / "baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--min-seconds", type=float, default=0.01)
+    parser.add_argument("--min-bytes", type=int, default=1024 * 1024)
+    parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false")
+    parser.add_argument("--variant", nargs=2, metavar=("DATASET", "SCALE"), help=argparse.SUPPRESS)
+    parser.add_argument("--variant-output", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--store-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    if args.variant:
+        file_name, scale = args.variant[0], int(args.variant[1])
+        rows, stages = benchmark_dataset(file_name, DATASETS.get(file_name), scale, args.store_dir, args.repeat, args.trace_memory)
+        args.variant_output.write_text(json.dumps({"rows": rows, "stages": stages}))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as store_dir:
+        for file_name in args.datasets:
+            for scale in args.scales:
+                rows, stages = run_variant(file_name, scale, store_dir, args.repeat, args.trace_memory)
+                for stage_name, measurement in stages.items():
+                    key = "{0}@{1}x/{2}".format(file_name, scale, stage_name)
+                    results[key] = dict(measurement, rows=rows)
+                    if stage_name == "failed":
+                        print("{0:<60} {1}".format(key, measurement.get("error")))
+                        continue
+                    print("{0:<60} {1:>9} rows {2:>10.4f} s {3:>10} peak {4:>10} payload".format(
+                        key, rows, measurement.get("seconds"), format_bytes(measurement.get("peak_bytes")), format_bytes(measurement.get("payload_bytes"))))
+                sys.stdout.flush()
+
+    report = {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__, "machine": platform.platform(), "results": results}
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=1))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=1))
+        print("Baseline saved to {0}".format(args.baseline))
+        return
+    if not args.baseline.exists():
+        print("No baseline at {0}, run with --save-baseline to store one.".format(args.baseline))
+        return
+    regressions = compare(results, json.loads(args.baseline.read_text()).get("results"), args.threshold, args.min_seconds, args.min_bytes)
+    for key, metric, previous, current in regressions:
+        if previous is None:
+            print("REGRESSION {0}: {1}".format(key, metric))
+        else:
+            print("REGRESSION {0} {1}: {2:.4g} -> {3:.4g}".format(key, metric, previous, current))
+    if regressions:
+        sys.exit(1)
+    print("No stage regressed more than {0:.0%} against {1}".format(args.threshold, args.baseline))
+
+
+def format_bytes(value):
+    if value is None:
+        return "-"
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return "{0:.0f} {1}".format(value, unit)
+        value /= 1024
+    return "{0:.1f} GB".format(value)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import json, subprocess, sys
+from pathlib import Path
+
+import pandas as pd
+
+
+def test_one_spec_in_json_and_png(tmp_path):
+    input_dir = tmp_path / "workbooks"
+    input_dir.mkdir()
+    pd.DataFrame({"Sex": ["male", "female", "female", "male"], "Age": [22.0, 38.0, 26.0, 35.0]}).to_csv(input_dir / "titanic.csv", index=False)
+    graphs = json.dumps([{"type": "boxplot", "x": ["Age"], "group_by": "Sex"}])
+    types = json.dumps({"Sex": "categoric", "Age": "numeric"})
+    for output_format in ("json", "png"):
+        output_dir = tmp_path / output_format
+        subprocess.run([sys.executable, "-m", "utils.batch_charts", str(input_dir), str(output_dir), "--graphs", graphs, "--types", types,
+                        "--format", output_format, "--workers", "1", "--store-dir", str(tmp_path / "store")],
+                       cwd=Path(__file__).resolve().parents[1], check=True)
+        report = json.loads((output_dir / "report.json").read_text())
+        assert report.get("failed") == 0
+        assert report.get("reports")[0].get("written") == ["00_{0}.{1}".format("data_boxplot_x" if output_format == "json" else "boxplot", output_format)]
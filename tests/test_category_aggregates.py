@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from visualization.CategoryAggregates import CategoryAggregates
+
+
+def test_merged_chunks_match_one_pass():
+    rng = np.random.default_rng(0)
+    column = pd.Series(rng.choice(["a", "b", "c", "d", None], 3000)).astype("category")
+    values = pd.Series(rng.normal(10, 3, 3000))
+    values[rng.choice(3000, 300, replace=False)] = np.nan
+    single = CategoryAggregates(column, values)
+    merged = CategoryAggregates(column.iloc[:1000].cat.remove_unused_categories(), values.iloc[:1000])
+    for start in (1000, 2000):
+        # Each chunk is cast on its own and only knows the categories it holds.
+        chunk = pd.Series(column.iloc[start:start + 1000].astype(object)).astype("category")
+        merged.merge(CategoryAggregates(chunk, values.iloc[start:start + 1000]))
+
+    for order in ("count", "category"):
+        expected, actual = single.top(("count", "sum", "mean"), 2, order), merged.top(("count", "sum", "mean"), 2, order)
+        assert actual.get("names") == expected.get("names")
+        assert actual.get("count") == expected.get("count")
+        assert np.allclose(actual.get("sum"), expected.get("sum"))
+        assert np.allclose(actual.get("mean"), expected.get("mean"))
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from visualization.Correlation import CorrelationStats
+
+
+def test_merged_statistics_match_one_pass_and_pandas():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(3000, 3)) @ np.array([[1.0, 0.5, 0.0], [0.0, 1.0, 0.3], [0.0, 0.0, 1.0]]) + [1e6, -20.0, 0.0]
+    values[rng.choice(3000, 300, replace=False), 0] = np.nan
+    values[rng.choice(3000, 200, replace=False), 2] = np.nan
+    columns = ["a", "b", "c"]
+    single = CorrelationStats(columns).add(values)
+    merged = CorrelationStats(columns).add(values[:500])
+    for chunk in np.array_split(values[500:], 4):
+        merged.merge(CorrelationStats(columns).add(chunk))
+
+    expected = pd.DataFrame(values, columns=columns).corr().to_numpy()
+    assert merged.rows == single.rows == 3000
+    assert np.allclose(single.pearson(), expected)
+    assert np.allclose(merged.pearson(), expected)
+    assert np.allclose(merged.pearson(["c", "a"]), expected[np.ix_([2, 0], [2, 0])])
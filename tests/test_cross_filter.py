@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from visualization.CrossFilter import CrossFilter, DatasetIndex
+from visualization.ProcessData import ProcessData
+
+
+def test_select_matches_a_pandas_mask():
+    rng = np.random.default_rng(0)
+    df_typed = pd.DataFrame({"Sex": pd.Categorical(rng.choice(["male", "female", None], 5000)),
+                             "Age": np.where(rng.random(5000) < 0.1, np.nan, rng.normal(40, 10, 5000)),
+                             "Date": pd.date_range("2020-01-01", periods=5000, freq="h")})
+    index = DatasetIndex(df_typed)
+    cases = [
+        ([{"column": "Sex", "values": ["female", "unknown"]}], df_typed.loc[:, "Sex"] == "female"),
+        ([{"column": "Age", "min": 30, "max": 45}], df_typed.loc[:, "Age"].between(30, 45)),
+        ([{"column": "Age", "max": 20}, {"column": "Sex", "values": ["male"]}], (df_typed.loc[:, "Age"] <= 20) & (df_typed.loc[:, "Sex"] == "male")),
+        ([{"column": "Date", "min": "2020-02-01", "max": "2020-02-03"}, {"column": "Age", "min": 40}],
+         df_typed.loc[:, "Date"].between("2020-02-01", "2020-02-03") & (df_typed.loc[:, "Age"] >= 40)),
+        ([], pd.Series(True, index=df_typed.index)),
+    ]
+    for filters, mask in cases:
+        assert index.select(filters).tolist() == np.flatnonzero(mask.to_numpy()).tolist()
+
+
+def test_query_reuses_the_index_of_a_dataset(tmp_path):
+    file_path = tmp_path / "upload.csv"
+    pd.DataFrame({"Sex": ["male", "female", "female", "male"], "Age": [22.0, 38.0, 26.0, 35.0]}).to_csv(file_path, index=False)
+    crossfilter = CrossFilter(ProcessData(tmp_path / "store"))
+    user_file_and_types = {"types": {"Sex": "categoric", "Age": "numeric"}}
+
+    frame = crossfilter.query(file_path, user_file_and_types, [{"column": "Sex", "values": ["female"]}, {"column": "Age", "max": 30}])
+    assert frame.loc[:, "Age"].tolist() == [26.0]
+    assert crossfilter.dataset_index(file_path, user_file_and_types) is crossfilter.dataset_index(file_path, user_file_and_types)
+    crossfilter.invalidate(ProcessData(tmp_path / "store").dataset_hash(file_path))
+    assert len(crossfilter.query(file_path, user_file_and_types, [])) == 4
@@ -0,0 +1,46 @@
+import threading
+
+from visualization.DatasetRegistry import LOCK_STRIPES, DatasetRegistry
+
+
+def test_evict_keeps_the_lock_files(tmp_path):
+    registry = DatasetRegistry(tmp_path / "registry.sqlite3", tmp_path / "locks", max_upload_bytes=0)
+    # Fixed ids, one lock stripe each.
+    dataset_ids = []
+    for index in range(20):
+        file_path = tmp_path / "upload_{0}.csv".format(index)
+        file_path.write_text("a\n1\n")
+        dataset_ids.append(registry.register("dataset_{0}".format(index), file_path.name, file_path, "hash"))
+        with registry.write_lock(dataset_ids[-1]):
+            pass
+    lock_files = sorted((tmp_path / "locks").iterdir())
+
+    # A reader holding its lock while the dataset is evicted keeps a lock that later writers still see.
+    reading, evicted = threading.Event(), threading.Event()
+
+    def read():
+        with registry.read_lock(dataset_ids[0]):
+            reading.set()
+            evicted.wait(5)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    reading.wait(5)
+    registry.evict()
+    evicted.set()
+    reader.join()
+
+    assert registry.get(dataset_ids[0]) is not None
+    assert all(registry.get(dataset_id) is None for dataset_id in dataset_ids[1:])
+    assert sorted((tmp_path / "locks").iterdir()) == lock_files
+    assert len(lock_files) <= LOCK_STRIPES
+
+
+def test_get_does_not_rewrite_a_recent_access(tmp_path):
+    registry = DatasetRegistry(tmp_path / "registry.sqlite3", tmp_path / "locks")
+    dataset_id = registry.register(registry.new_id(), "upload.csv", tmp_path / "upload.csv", "hash")
+    with registry._connect() as connection:
+        before = connection.execute("SELECT last_access FROM datasets").fetchone()[0]
+    registry.get(dataset_id)
+    with registry._connect() as connection:
+        assert connection.execute("SELECT last_access FROM datasets").fetchone()[0] == before
@@ -0,0 +1,69 @@
+import pandas as pd
+
+from visualization.DatasetStore import DatasetStore
+from visualization.ProcessData import ProcessData
+
+
+def test_read_file_after_evict(tmp_path):
+    file_path = tmp_path / "upload.csv"
+    pd.DataFrame({"Sex": ["male", "female", "female"], "Age": [22.0, 38.0, 26.0]}).to_csv(file_path, index=False)
+    store_dir = tmp_path / "store"
+    process = ProcessData(store_dir)
+    content_hash = process.store_file(file_path)
+
+    DatasetStore(store_dir, max_age_seconds=-1).evict()
+    assert DatasetStore(store_dir).dataset_path(content_hash) is None
+
+    df = process.read_file(file_path)
+    assert df.loc[:, "Sex"].tolist() == ["male", "female", "female"]
+    assert process.dataset_hash(file_path) == content_hash
+
+
+def test_concurrent_remember_keeps_every_entry(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    store_dir = tmp_path / "store"
+
+    def remember(worker):
+        store = DatasetStore(store_dir)
+        for index in range(20):
+            file_path = tmp_path / "{0}_{1}.csv".format(worker, index)
+            file_path.write_text("a\n1\n")
+            # The index only keeps files whose dataset is stored.
+            (store_dir / "{0}_{1}.feather".format(worker, index)).touch()
+            store._remember(file_path, "{0}_{1}".format(worker, index), {"rows": 1})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(remember, range(8)))
+    index = DatasetStore(store_dir)._read_index()
+    assert len(index.get("files")) == 160
+    assert len(index.get("datasets")) == 160
+
+
+def test_index_forgets_deleted_uploads_and_evicted_datasets(tmp_path):
+    store = DatasetStore(tmp_path / "store")
+    file_paths = [tmp_path / "{0}.csv".format(name) for name in ("deleted", "evicted", "kept")]
+    for value, file_path in enumerate(file_paths):
+        pd.DataFrame({"a": [value]}).to_csv(file_path, index=False)
+    deleted_hash, evicted_hash = store.put(file_paths[0]), store.put(file_paths[1])
+    file_paths[0].unlink()
+    store.remove(evicted_hash)
+    kept_hash = store.put(file_paths[2])
+
+    files = store._read_index().get("files")
+    assert [entry.get("hash") for entry in files.values()] == [kept_hash]
+    assert deleted_hash != evicted_hash
+
+
+def test_appended_upload_finds_its_base(tmp_path):
+    store = DatasetStore(tmp_path / "store")
+    base = pd.DataFrame({"Sex": ["male", "female"] * 50, "Age": list(range(100))})
+    # The appended rows leave an Age cell empty, so the reader infers float64 where the base had int64.
+    appended = pd.concat([base, pd.DataFrame({"Sex": ["female", "male"], "Age": [None, 7.0]})], ignore_index=True)
+    other = base.assign(Age=base.loc[:, "Age"] + 1)
+    for name, dataframe in (("base", base), ("appended", appended), ("other", other)):
+        dataframe.to_csv(tmp_path / "{0}.csv".format(name), index=False)
+
+    base_hash = store.put(tmp_path / "base.csv", chunk_rows=30)
+    assert store.base(store.put(tmp_path / "appended.csv", chunk_rows=40)) == (base_hash, 100)
+    assert store.base(store.put(tmp_path / "other.csv")) is None
+    assert store.base(base_hash) is None
@@ -0,0 +1,26 @@
+import os
+
+from visualization.ChartCache import ChartCache
+from visualization.DiskQuota import DiskQuota
+
+
+def test_evict_skips_files_unlinked_during_the_scan(tmp_path):
+    cache = ChartCache(tmp_path, max_disk_bytes=0)
+    # A dangling link stats like a cache file another process unlinked after the directory was listed.
+    (tmp_path / "gone.json").symlink_to(tmp_path / "missing.json")
+    cache.put("key", {"json_name": "data_pieplot", "payload": {}})
+    cache.evict()
+    assert not (tmp_path / "key.json").exists()
+
+
+def test_scans_only_when_the_writes_may_pass_the_quota(tmp_path):
+    quota = DiskQuota(tmp_path, (".json",), max_bytes=100)
+    scans = []
+    evict = quota.evict
+    quota.evict = lambda: scans.append(1) or evict()
+    for index in range(5):
+        (tmp_path / "{0}.json".format(index)).write_bytes(b"x" * 30)
+        quota.added(30)
+    # The first write scans, the next two stay under 100 bytes, the fourth and fifth pass them.
+    assert len(scans) == 3
+    assert sum(os.path.getsize(path) for path in tmp_path.glob("*.json")) <= 100
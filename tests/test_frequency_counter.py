@@ -0,0 +1,37 @@
+from collections import Counter
+
+import numpy as np
+
+from visualization.FrequencyCounter import FrequencyCounter, iter_ngrams
+
+
+def zipf_rows(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    words = np.array(["w{0}".format(rank) for rank in range(2000)])
+    return [" ".join(words[np.minimum(rng.zipf(1.3, 6), 2000) - 1]) for _ in range(n_rows)]
+
+
+def test_merged_counters_bound_the_single_pass_counts():
+    rows = zipf_rows(6000, 0)
+    exact = Counter(iter_ngrams(rows))
+    single = FrequencyCounter(capacity=300).update(rows)
+    merged = FrequencyCounter(capacity=300).update(rows[:2000])
+    for start in (2000, 4000):
+        merged.merge(FrequencyCounter(capacity=300).update(rows[start:start + 2000]))
+
+    for counter in (single, merged):
+        # Space-Saving counts never undercount and overcount by at most the error bound.
+        for term, count in counter.most_common(300):
+            assert exact.get(term) <= count <= exact.get(term) + counter.error_bound
+    # Every term seen more often than the bound is kept.
+    heavy = {term for term, count in exact.items() if count > merged.error_bound}
+    assert heavy <= {term for term, _ in merged.most_common(300)}
+    assert [term for term, _ in merged.most_common(10)] == [term for term, _ in exact.most_common(10)]
+
+
+def test_exact_counters_merge_to_the_exact_counts():
+    rows = zipf_rows(1000, 1)
+    merged = FrequencyCounter(exact=True).update(rows[:500]).merge(FrequencyCounter(exact=True).update(rows[500:]))
+    assert merged.error_bound == 0
+    exact = Counter(iter_ngrams(rows))
+    assert dict(merged.most_common(len(exact) + 1)) == dict(exact)
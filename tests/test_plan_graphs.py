@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from visualization.DatasetSummaries import DatasetSummaries
+from visualization.PlanGraphs import PlanGraphs
+from visualization.ProcessData import ProcessData
+from visualization.ReadChunks import TypedChunks
+from visualization.VisualizeData import VisualizeData, encode_json
+
+
+def stored_dataset(tmp_path, dataframe):
+    file_path = tmp_path / "upload.csv"
+    dataframe.to_csv(file_path, index=False)
+    process = ProcessData(tmp_path / "store")
+    process.store_file(file_path)
+    return process, file_path
+
+
+def test_histogram_bins_of_chunks_match_the_whole_column(tmp_path):
+    rng = np.random.default_rng(0)
+    # The first chunk holds a narrow slice of the values, its spread says nothing about the column.
+    values = np.concatenate([rng.normal(0, 0.01, 1000), rng.exponential(50, 4000)])
+    values[rng.choice(5000, 200, replace=False)] = np.nan
+    process, file_path = stored_dataset(tmp_path, pd.DataFrame({"Fare": values}))
+    user_file_and_types = {"types": {"Fare": "numeric"}}
+    planner = PlanGraphs(process, VisualizeData(), max_workers=1)
+    df_typed = process.cast_datatypes(process.read_file(file_path), user_file_and_types)
+    chunks = TypedChunks(process, file_path, user_file_and_types, chunk_rows=700)
+
+    for bins in ("fd", "sturges", "scott", "auto", 30, (0, 10, 100, 1000)):
+        key = ("histogram", "Fare", bins)
+        whole, folded = planner.compute_intermediate(df_typed, key, None), planner.fold_chunks(chunks, key)
+        assert np.allclose(folded.edges, whole.edges)
+        assert folded.counts.tolist() == whole.counts.tolist()
+
+
+def test_appended_dataset_merges_summaries_into_the_same_payloads(tmp_path):
+    rng = np.random.default_rng(1)
+    n_rows = 600
+    base = pd.DataFrame({"Sex": rng.choice(["male", "female"], n_rows), "Age": rng.normal(40, 10, n_rows).round(1),
+                         "Fare": rng.exponential(30, n_rows).round(2), "Name": rng.choice(["mr john smith", "mrs ada", "miss mary ann"], n_rows)})
+    appended = pd.concat([base, base.iloc[:150].assign(Sex="other")], ignore_index=True)
+    base.to_csv(tmp_path / "base.csv", index=False)
+    appended.to_csv(tmp_path / "appended.csv", index=False)
+    user_file_and_types = {"types": {"Sex": "categoric", "Age": "numeric", "Fare": "numeric", "Name": "text"}}
+    graphs = [{"type": "pieplot", "categoric_col_name": "Sex"}, {"type": "barplot", "x": "Sex", "numeric_col_name": "Fare"},
+              {"type": "histogram", "x": "Age", "bins": [0, 20, 40, 60, 80, 100]}, {"type": "correlation"}, {"type": "wordcloud", "x": "Name"}]
+    process = ProcessData(tmp_path / "store")
+
+    def run(file_path, summaries):
+        planner = PlanGraphs(process, VisualizeData(), max_workers=1, summaries=summaries)
+        merges = []
+        merge_rows = planner.merge_rows
+        planner.merge_rows = lambda *arguments: merges.append(arguments[2]) or merge_rows(*arguments)
+        df_typed = process.cast_datatypes(process.read_file(file_path), user_file_and_types)
+        charts = planner.run(df_typed, graphs, process.dataset_hash(file_path), column_types=user_file_and_types.get("types"),
+                             base=process.dataset_base(file_path))
+        return charts, merges
+
+    summaries = DatasetSummaries(tmp_path / "summaries")
+    run(tmp_path / "base.csv", summaries)
+    merged, merges = run(tmp_path / "appended.csv", summaries)
+    fresh, _ = run(tmp_path / "appended.csv", None)
+
+    assert process.dataset_base(tmp_path / "appended.csv") == (process.dataset_hash(tmp_path / "base.csv"), n_rows)
+    assert sorted(key[0] for key in merges) == ["categories", "categories", "correlation_stats", "histogram", "ngrams"]
+    assert [chart[0] for chart in merged] == [chart[0] for chart in fresh]
+    assert json.loads(encode_json(merged)) == json.loads(encode_json(fresh))
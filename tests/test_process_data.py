@@ -0,0 +1,15 @@
+import warnings
+
+import pandas as pd
+
+from visualization.ProcessData import ProcessData
+
+
+def test_suggest_datatypes_without_warnings(tmp_path):
+    sample = pd.DataFrame({"Name": ["Passenger number {0} of the crossing".format(row) for row in range(20)],
+                           "Sex": ["male", "female", "female", "female"] * 5, "Fare": [7.25, 71.28, 7.93, 53.1] * 5,
+                           "Date": ["2021-03-01", "2021-03-02", "2021-03-03", "2021-03-04"] * 5})
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        suggested_types = ProcessData(tmp_path / "store").suggest_datatypes(sample)
+    assert suggested_types == {"Name": "text", "Sex": "categoric", "Fare": "categoric", "Date": "datetime"}
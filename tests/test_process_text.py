@@ -0,0 +1,26 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from visualization.ProcessText import ProcessText
+
+
+def test_concurrent_stemming_with_a_full_cache():
+    def stemmer(tokens):
+        return [token[:3] for token in tokens]
+
+    process_text = ProcessText({"english": []}, stemmers={"english": stemmer}, stem_cache_size=50)
+    rows = [" ".join("word{0}x{1}".format(row, token) for token in range(20)) for row in range(40)]
+
+    def stem(row):
+        return process_text.stem_rows([row] * 5, "english")
+
+    # Threads switch often enough for one call to clear the cache while another still reads it.
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for _ in range(20):
+                for row, stemmed in zip(rows, pool.map(stem, rows)):
+                    assert stemmed == [" ".join(token[:3] for token in row.split())] * 5
+    finally:
+        sys.setswitchinterval(switch_interval)
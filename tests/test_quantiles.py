@@ -0,0 +1,30 @@
+import numpy as np
+
+from visualization.Quantiles import QuantileSketch
+
+QUANTILES = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def rank_errors(values, sketch):
+    ranks = np.searchsorted(np.sort(values), sketch.quantile(QUANTILES), side="right") / len(values)
+    return np.abs(ranks - np.array(QUANTILES))
+
+
+def test_merged_sketches_stay_within_the_rank_error():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.lognormal(0, 1, 150000), rng.normal(-5, 1, 50000)])
+    rng.shuffle(values)
+    single = QuantileSketch().update(values)
+    merged = QuantileSketch(seed=1)
+    for chunk in np.array_split(values, 7):
+        merged.merge(QuantileSketch(seed=2).update(chunk))
+
+    assert merged.count == single.count == len(values)
+    assert rank_errors(values, single).max() <= single.rank_error
+    assert rank_errors(values, merged).max() <= merged.rank_error
+
+
+def test_small_sketches_are_exact():
+    values = np.arange(100, dtype="float64")
+    merged = QuantileSketch().update(values[:40]).merge(QuantileSketch().update(values[40:]))
+    assert merged.quantile([0.5]).tolist() == [49.0]
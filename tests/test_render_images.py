@@ -0,0 +1,44 @@
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+import pandas as pd
+
+from visualization.ProcessData import ProcessData
+from visualization.RenderImages import RenderImages, plot_graph
+from visualization.VisualizeData import VisualizeData
+
+
+def typed_frames(process):
+    rng = np.random.default_rng(0)
+    df_typed = pd.DataFrame({"Age": rng.normal(40, 10, 500), "Fare": rng.exponential(30, 500),
+                             "Sex": pd.Categorical(rng.choice(["male", "female"], 500)),
+                             "Cabin": pd.Categorical(rng.choice(list("abcdefghij"), 500))})
+    return {"typed": df_typed, "categoric": process.process_categorical(df_typed), "numeric": process.process_numeric(df_typed),
+            "datetime": process.process_datetime(df_typed)}
+
+
+def test_plot_graph_reads_the_json_spec_fields(tmp_path):
+    frames = typed_frames(ProcessData(tmp_path / "store"))
+    visualizer = VisualizeData()
+    specs = [{"type": "boxplot", "x": ["Age"], "group_by": "Sex"}, {"type": "boxplot", "x": ["Age", "Fare"]},
+             {"type": "pieplot", "categoric_col_name": "Cabin", "top_k": 3}, {"type": "barplot", "x": "Cabin", "top_k": 3},
+             {"type": "barplot", "categoric_col_name": "Cabin", "numeric_col_name": "Fare", "aggregation": "median"},
+             {"type": "histogram", "x": "Age", "bins": "sturges"}, {"type": "histogram", "x": "Fare", "bins": "fd", "kde": True}]
+    for position, graph in enumerate(specs):
+        image_file = tmp_path / "{0}.png".format(position)
+        assert plot_graph(visualizer, frames, graph, image_file)
+        assert image_file.stat().st_size > 0
+    assert not plot_graph(visualizer, frames, {"type": "boxplot", "x": ["Age"], "group_by": "Fare"}, tmp_path / "skipped.png")
+
+
+def test_render_leaves_no_image_named_temp_file(tmp_path):
+    file_path = tmp_path / "upload.csv"
+    pd.DataFrame({"Sex": ["male", "female", "female"], "Age": [22.0, 38.0, 26.0]}).to_csv(file_path, index=False)
+    process = ProcessData(tmp_path / "store")
+    renderer = RenderImages(process, tmp_path / "images", max_workers=1)
+    try:
+        images = renderer.render(file_path, {"types": {"Sex": "categoric", "Age": "numeric"}}, [{"type": "boxplot", "x": ["Age"], "group_by": "Sex"}])
+    finally:
+        renderer.close()
+    assert images[0] is not None and images[0].exists()
+    assert [path.name for path in (tmp_path / "images").glob("*.png")] == [images[0].name]
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from visualization.Correlation import correlation_matrix
+from visualization.VisualizeData import VisualizeData, lttb_indices
+
+
+def test_boxplot_leaves_out_rows_without_group():
+    dataframe = pd.DataFrame({"Sex": ["male", "male", "male", "male", "male", np.nan, "female", "female", "female"],
+                              "Age": [1.0, 2.0, 3.0, 4.0, 5.0, 1000.0, 10.0, 11.0, 12.0]})
+    data_boxplot = VisualizeData().prepare_boxplot(dataframe, "Age", group_by="Sex")
+
+    assert data_boxplot.get("x_axis") == ["female", "male"]
+    boxes, outliers = data_boxplot.get("series")
+    assert boxes.get("data") == [[10.0, 10.5, 11.0, 11.5, 12.0], [1.0, 2.0, 3.0, 4.0, 5.0]]
+    assert outliers.get("data") == []
+
+
+def test_spearman_with_missing_values_matches_pandas():
+    rng = np.random.default_rng(0)
+    df_numeric = pd.DataFrame(rng.normal(size=(200, 3)), columns=["a", "b", "c"])
+    df_numeric["b"] += df_numeric.loc[:, "a"] ** 3
+    df_numeric.iloc[rng.choice(200, 40, replace=False), 0] = np.nan
+    df_numeric.iloc[rng.choice(200, 30, replace=False), 1] = np.nan
+    expected = df_numeric.corr("spearman").to_numpy()
+
+    assert np.allclose(correlation_matrix(df_numeric, "spearman"), expected)
+    assert np.allclose(correlation_matrix(df_numeric.dropna(), "spearman"), df_numeric.dropna().corr("spearman").to_numpy())
+
+
+def test_lttb_keeps_max_points_with_the_ends_and_the_peaks():
+    x = np.arange(10000, dtype="int64")
+    y = np.sin(x / 300.0)
+    y[4321] = 50.0
+    indices = lttb_indices(x, y, 500)
+
+    assert len(indices) <= 500
+    assert indices[0] == 0 and indices[-1] == 9999
+    assert np.all(np.diff(indices) > 0)
+    assert 4321 in indices
+    assert lttb_indices(x[:100], y[:100], 500).tolist() == list(range(100))
+
+
+def test_timeplot_keeps_max_points():
+    index = pd.date_range("2020-01-01", periods=20000, freq="min")
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"Date": index, "Fare": rng.normal(size=20000).cumsum(), "Age": rng.normal(size=20000).cumsum(),
+                       "Pclass": rng.normal(size=20000).cumsum()})
+    for y_columns in (["Fare"], ["Fare", "Age", "Pclass"]):
+        # Series peak at different rows, their kept rows only partly overlap.
+        data_timeplot = VisualizeData().prepare_timeplot(df, "Date", *y_columns, granularity="raw", max_points=700)
+        assert len(data_timeplot[0].get("x_axis")) <= 700
+        assert all(len(series.get("data")) == len(data_timeplot[0].get("x_axis")) for series in data_timeplot[1:])
@@ -0,0 +1,150 @@
+import argparse, json, os, sys, time, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from utils.paths import get_store_folder
+
+
+WORKBOOK_EXTENSIONS = (".xlsx", ".xls", ".csv", ".csv.gz", ".parquet")
+OUTPUT_FORMATS = ("json", "png", "pdf")
+
+_worker = {}
+
+
+def _init_worker(store_dir):
+    # One ProcessData, VisualizeData and planner per worker process, built once and reused for every file.
+    # The planner runs one chart at a time, the files already keep every core busy.
+    import matplotlib
+    matplotlib.use("Agg")
+    from visualization.ProcessData import ProcessData
+    from visualization.VisualizeData import VisualizeData
+    from visualization.PlanGraphs import PlanGraphs
+    _worker["process"] = ProcessData(store_dir)
+    _worker["visualizer"] = VisualizeData()
+    _worker["planner"] = PlanGraphs(_worker.get("process"), _worker.get("visualizer"), max_workers=1)
+
+
+def process_workbook(file_path, user_file_and_types, graph_types_list, output_dir, output_format):
+    # Writes the charts of one workbook to output_dir, one file per graph named by its position in the graph
+    # list. Returns the report entry of the file, errors included instead of raised.
+    from visualization.RenderImages import plot_graph
+    from visualization.VisualizeData import encode_json
+    from visualization.ReadChunks import TypedChunks
+    process, visualizer, planner = _worker.get("process"), _worker.get("visualizer"), _worker.get("planner")
+    report = {"file": str(file_path), "status": "ok", "rows": None, "written": [], "skipped": [], "error": None}
+    start = time.perf_counter()
+    try:
+        sheet_name = user_file_and_types.get("sheet_name")
+        columns = process.required_columns(graph_types_list, user_file_and_types)
+        # As in /visualize/, mergeable intermediates are folded over chunks and the rows are only read whole
+        # when a graph needs them.
+        chunks = TypedChunks(process, file_path, user_file_and_types, columns)
+        report["rows"] = chunks.rows
+        df_typed = chunks.head()
+        if output_format != "json" or planner.needs_rows(df_typed, graph_types_list):
+            df_typed = process.cast_datatypes(process.read_file(file_path, sheet_name, columns), user_file_and_types, columns)
+            chunks = None
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if output_format == "json":
+            for position, chart in enumerate(planner.run(df_typed, graph_types_list, chunks=chunks)):
+                if chart is None:
+                    report["skipped"].append(position)
+                    continue
+                output_file = output_dir / "{0:02d}_{1}.json".format(position, chart[0])
+                output_file.write_bytes(encode_json(chart[1]))
+                report["written"].append(output_file.name)
+        else:
+            frames = {"typed": df_typed, "categoric": process.process_categorical(df_typed),
+                      "numeric": process.process_numeric(df_typed), "datetime": process.process_datetime(df_typed)}
+            for position, graph in enumerate(graph_types_list):
+                output_file = output_dir / "{0:02d}_{1}.{2}".format(position, graph.get("type"), output_format)
+                if plot_graph(visualizer, frames, graph, output_file):
+                    report["written"].append(output_file.name)
+                else:
+                    report["skipped"].append(position)
+    except Exception as error:
+        report.update({"status": "failed", "error": "{0}: {1}".format(type(error).__name__, error),
+                       "traceback": traceback.format_exc()})
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def find_workbooks(input_dir, recursive=False):
+    # Largest files first, so the long ones do not start last and leave the other workers idle at the end.
+    pattern = "**/*" if recursive else "*"
+    workbooks = [path for path in Path(input_dir).glob(pattern) if path.is_file() and path.name.lower().endswith(WORKBOOK_EXTENSIONS) and not path.name.startswith("~$")]
+    return sorted(workbooks, key=lambda path: path.stat().st_size, reverse=True)
+
+
+def read_json_argument(value):
+    # A JSON file path or the JSON itself.
+    if Path(value).is_file():
+        return json.loads(Path(value).read_text(encoding="utf8"))
+    return json.loads(value)
+
+
+def run_batch(workbooks, input_dir, user_file_and_types, graph_types_list, output_dir, output_format="json", max_workers=None, store_dir=None):
+    # Output of every workbook goes to its own directory under output_dir, named and placed like the file
+    # below input_dir (report.csv and report.parquet do not share one).
+    reports = []
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(str(store_dir or get_store_folder()),)) as pool:
+        futures = {}
+        for file_path in workbooks:
+            relative = file_path.relative_to(input_dir)
+            workbook_dir = Path(output_dir) / relative
+            futures[pool.submit(process_workbook, file_path, user_file_and_types, graph_types_list, workbook_dir, output_format)] = file_path
+        for future in as_completed(futures):
+            try:
+                report = future.result()
+            except Exception as error:
+                # A worker that died (out of memory, killed) takes its file down with it, not the batch.
+                report = {"file": str(futures.get(future)), "status": "failed", "rows": None, "written": [], "skipped": [],
+                          "error": "{0}: {1}".format(type(error).__name__, error), "seconds": None}
+            reports.append(report)
+            print("{0:<8} {1:>9} rows {2:>8} s {3:>3} charts  {4}{5}".format(
+                report.get("status"), report.get("rows") if report.get("rows") is not None else "-",
+                "{0:.2f}".format(report.get("seconds")) if report.get("seconds") is not None else "-",
+                len(report.get("written")), report.get("file"), "  " + report.get("error") if report.get("error") else ""))
+            sys.stdout.flush()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare chart payloads (or render images) for every workbook, csv or parquet file of a directory on a process pool.")
+    parser.add_argument("input_dir", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--graphs", required=True, help="graph list as in the types field of /visualize/, a JSON file or inline JSON")
+    parser.add_argument("--types", required=True, help="column types as in user_file_and_types.json or the /select-types/ form, a JSON file or inline JSON")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="json")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--store-dir", type=Path, default=None)
+    parser.add_argument("--sheet", default=None, help="worksheet name to read from every workbook, the first sheet by default")
+    args = parser.parse_args()
+
+    graph_types_list = read_json_argument(args.graphs)
+    column_types = read_json_argument(args.types)
+    user_file_and_types = column_types if isinstance(column_types.get("types"), dict) else {"types": column_types}
+    if args.sheet is not None:
+        user_file_and_types = dict(user_file_and_types, sheet_name=args.sheet)
+    if not isinstance(graph_types_list, list):
+        parser.error("--graphs must be a JSON list of graph specs")
+    workbooks = find_workbooks(args.input_dir, args.recursive)
+    if not workbooks:
+        parser.error("no {0} files in {1}".format("/".join(WORKBOOK_EXTENSIONS), args.input_dir))
+
+    start = time.perf_counter()
+    reports = run_batch(workbooks, args.input_dir, user_file_and_types, graph_types_list, args.output_dir, args.format, args.workers, args.store_dir)
+    failed = [report for report in reports if report.get("status") != "ok"]
+    summary = {"files": len(reports), "failed": len(failed), "seconds": time.perf_counter() - start, "format": args.format,
+               "workers": args.workers or os.cpu_count(), "reports": sorted(reports, key=lambda report: report.get("file"))}
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    (args.output_dir / "report.json").write_text(json.dumps(summary, indent=1))
+    print("{0} files, {1} failed, {2:.1f} s. Report written to {3}".format(len(reports), len(failed), summary.get("seconds"), args.output_dir / "report.json"))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
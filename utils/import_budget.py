@@ -0,0 +1,58 @@
+import argparse, statistics, subprocess, sys
+from utils.paths import get_root_folder
+
+
+HEAVY_MODULES = ("matplotlib", "seaborn", "wordcloud", "sklearn", "nltk", "snowballstemmer", "scipy")
+
+
+def measure_import(module, runs=5):
+    # Imports the module in fresh interpreters with -X importtime. Returns, per run, the cumulative microseconds
+    # of the module, the cumulative microseconds of each module it imported directly, and every module imported.
+    results = []
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import {0}".format(module)],
+                                   cwd=get_root_folder(), capture_output=True, text=True, check=True)
+        result = {"total_us": 0, "children": [], "modules": set()}
+        children = []
+        for line in completed.stderr.splitlines():
+            if not line.startswith("import time:") or line.count("|") != 2:
+                continue
+            _, cumulative_us, name = line.split("|")
+            if not cumulative_us.strip().isdigit():
+                continue
+            # A module is reported after everything it imported, one level of indentation deeper.
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            result["modules"].add(name.strip())
+            if depth == 1:
+                children.append((name.strip(), int(cumulative_us)))
+            elif depth == 0:
+                if name.strip() == module:
+                    result["total_us"], result["children"] = int(cumulative_us), children
+                children = []
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold import time of a module against a budget.")
+    parser.add_argument("module", nargs="?", default="app_visualize.views")
+    parser.add_argument("--budget-ms", type=float, default=500)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    results = measure_import(args.module, args.runs)
+    median_ms = statistics.median(result.get("total_us") for result in results) / 1000
+    slowest = sorted(results[-1].get("children"), key=lambda child: child[1], reverse=True)[:args.top]
+    heavy = sorted({name.split(".")[0] for name in results[-1].get("modules")} & set(HEAVY_MODULES))
+    print("{0}: median {1:.0f} ms over {2} runs, budget {3:.0f} ms".format(args.module, median_ms, args.runs, args.budget_ms))
+    for name, cumulative_us in slowest:
+        print("  {0:>8.1f} ms  {1}".format(cumulative_us / 1000, name))
+    if heavy:
+        print("Imported eagerly: {0}".format(", ".join(heavy)))
+    if median_ms > args.budget_ms or heavy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
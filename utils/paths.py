@@ -10,4 +10,28 @@ def get_visualization_folder():
     return get_root_folder() / "visualization"
 
 def get_data_folder():
-    return get_root_folder() / "visualization/data"
\ No newline at end of file
+    return get_root_folder() / "visualization/data"
+
+def get_store_folder():
+    return get_data_folder() / "store"
+
+def get_chart_cache_folder():
+    return get_data_folder() / "chart_cache"
+
+def get_image_cache_folder():
+    return get_data_folder() / "image_cache"
+
+def get_summary_folder():
+    return get_data_folder() / "summaries"
+
+def get_profile_folder():
+    return get_data_folder() / "profiles"
+
+def get_registry_path():
+    return get_data_folder() / "registry.sqlite3"
+
+def get_lock_folder():
+    return get_data_folder() / "locks"
+
+def get_jobs_path():
+    return get_data_folder() / "jobs.sqlite3"
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+
+AGGREGATIONS = ("count", "sum", "mean", "median")
+
+
+class CategoryAggregates():
+    # Per-category count, sum, mean and median of a numeric column (or only counts) from the integer codes of
+    # the categorical column. Counts and sums are one np.bincount each over the codes, medians come
+    # from the values grouped by code. Only categories that occur are kept (observed=True), missing categories and values are
+    # left out like value_counts() and groupby() do.
+    def __init__(self, column, values=None):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes, categories = column.cat.codes.to_numpy(), column.cat.categories
+        else:
+            codes, categories = pd.factorize(column)
+            categories = pd.Index(categories)
+        codes = codes.astype("intp")
+        self._categories = categories
+        self._counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+        self._codes, self._values, self._n_values, self._sums = None, None, None, None
+        if values is not None:
+            values = pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            valid = (codes >= 0) & ~np.isnan(values)
+            self._codes, self._values = codes[valid], values[valid]
+            self._n_values = np.bincount(self._codes, minlength=len(categories))
+            self._sums = np.bincount(self._codes, weights=self._values, minlength=len(categories))
+        self._runs = None
+
+    def __len__(self):
+        return int(np.count_nonzero(self._counts))
+
+    def __getstate__(self):
+        # Stored summaries keep the per-category totals only, not the rows the medians are taken from.
+        state = dict(self.__dict__)
+        state.update({"_codes": None, "_values": None, "_runs": None})
+        return state
+
+    def merge(self, other):
+        # Adds the totals of another column (appended rows, a chunk) category by category, matched by name.
+        # The rows are not kept, medians of the merged totals are not available.
+        categories = self._categories.append(other._categories.difference(self._categories, sort=False))
+        if self._categories.is_monotonic_increasing and other._categories.is_monotonic_increasing:
+            # Categories cast from the column are sorted, the merged ones stay sorted like a cast of all rows.
+            try:
+                categories = categories.sort_values()
+            except TypeError:
+                pass
+        own_positions, positions = categories.get_indexer(self._categories), categories.get_indexer(other._categories)
+        for name in ("_counts", "_n_values", "_sums"):
+            mine, others = getattr(self, name), getattr(other, name)
+            if mine is None or others is None:
+                setattr(self, name, None)
+                continue
+            merged = np.zeros(len(categories), dtype=np.result_type(mine, others))
+            merged[own_positions] = mine
+            merged[positions] += others
+            setattr(self, name, merged)
+        self._categories = categories
+        self._codes, self._values, self._runs = None, None, None
+        return self
+
+    def aggregate(self, aggregation, positions):
+        # Aggregation over the given category positions, one value each.
+        if aggregation == "count":
+            return self._counts[positions]
+        if self._sums is None:
+            raise ValueError("Aggregation {0} needs a numeric column".format(aggregation))
+        if aggregation == "sum":
+            return self._sums[positions]
+        if aggregation == "mean":
+            with np.errstate(all="ignore"):
+                return self._sums[positions] / self._n_values[positions]
+        if aggregation == "median":
+            if self._values is None:
+                raise ValueError("Medians need the rows, merged aggregates only keep totals")
+            return self.medians(positions)
+        raise ValueError("Unknown aggregation {0}".format(aggregation))
+
+    def medians(self, positions):
+        # The values grouped by code with one stable sort of the codes (kept for later calls), then a partial
+        # sort of each requested category's run only: the cost follows the categories shown, not all of them.
+        if self._runs is None:
+            order = np.argsort(self._codes, kind="stable")
+            self._runs = (self._values[order], np.concatenate(([0], np.cumsum(self._n_values))))
+        grouped_values, bounds = self._runs
+        return np.array([np.median(grouped_values[bounds[position]:bounds[position + 1]]) if self._n_values[position] else np.nan for position in positions])
+
+    def aggregate_rest(self, aggregation, positions):
+        # The same aggregation over all the given categories taken together, for the "Other" bucket.
+        if aggregation == "count":
+            return self._counts[positions].sum()
+        if self._sums is None:
+            raise ValueError("Aggregation {0} needs a numeric column".format(aggregation))
+        if aggregation == "sum":
+            return self._sums[positions].sum()
+        if aggregation == "mean":
+            n_values = self._n_values[positions].sum()
+            return self._sums[positions].sum() / n_values if n_values else np.nan
+        if aggregation == "median":
+            if self._values is None:
+                raise ValueError("Medians need the rows, merged aggregates only keep totals")
+            in_rest = np.zeros(len(self._counts), dtype="bool")
+            in_rest[positions] = True
+            rest = self._values[in_rest[self._codes]]
+            return np.median(rest) if len(rest) else np.nan
+        raise ValueError("Unknown aggregation {0}".format(aggregation))
+
+    def top(self, aggregations=("count",), top_k=None, order="count", other_label="Other"):
+        # {"names", one list per aggregation, "other"}: the top_k most frequent categories and, when there are
+        # more, one other_label entry aggregating the rest ("other" is how many categories it holds). order="count"
+        # lists the categories by descending count, order="category" in the order of the categories.
+        observed = np.flatnonzero(self._counts)
+        by_count = observed[np.argsort(-self._counts[observed], kind="stable")]
+        if top_k is None or len(by_count) <= top_k:
+            kept, rest = by_count, by_count[:0]
+        else:
+            kept, rest = by_count[:top_k], by_count[top_k:]
+        if order == "category":
+            kept = np.sort(kept)
+        table = {"names": self._categories.take(kept).to_list()}
+        for aggregation in aggregations:
+            table[aggregation] = self.aggregate(aggregation, kept).tolist()
+        if len(rest):
+            table["names"].append(other_label)
+            for aggregation in aggregations:
+                table[aggregation].append(np.asarray(self.aggregate_rest(aggregation, rest)).item())
+        table["other"] = len(rest)
+        return table
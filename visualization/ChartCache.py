@@ -0,0 +1,81 @@
+import hashlib, json, os, threading
+from collections import OrderedDict
+from pathlib import Path
+
+from visualization import Metrics
+from visualization.DiskQuota import DiskQuota
+
+
+class ChartCache():
+    # Prepared chart payloads keyed by (dataset content hash, column types, graph spec). The memory tier is
+    # a per-process LRU, the disk tier is a size-bounded directory of json files that every worker process
+    # shares. Keys start with the dataset hash so a replaced dataset drops all of its charts at once.
+    def __init__(self, cache_dir, max_items=256, max_disk_bytes=512 * 1024 * 1024):
+        self._cache_dir = Path(cache_dir)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._max_items = max_items
+        self._quota = DiskQuota(self._cache_dir, (".json",), max_disk_bytes)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def key(self, dataset_hash, column_types, graph):
+        spec = json.dumps({"types": column_types, "graph": graph}, sort_keys=True, default=str)
+        return "{0}_{1}".format(dataset_hash, hashlib.sha256(spec.encode("utf8")).hexdigest()[:32])
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                Metrics.count_lookup("chart_cache", "memory_hit")
+                return self._memory.get(key)
+        try:
+            with open(self._cache_dir / "{0}.json".format(key), encoding="utf8") as file:
+                entry = json.load(file)
+            os.utime(self._cache_dir / "{0}.json".format(key))
+        except (OSError, ValueError):
+            with self._lock:
+                self._counters["misses"] += 1
+            Metrics.count_lookup("chart_cache", "miss")
+            return None
+        with self._lock:
+            self._counters["disk_hits"] += 1
+        Metrics.count_lookup("chart_cache", "disk_hit")
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        tmp_path = self._cache_dir / "{0}.{1}.{2}.tmp".format(key, os.getpid(), threading.get_ident())
+        with open(tmp_path, "w", encoding="utf8") as file:
+            json.dump(entry, file, separators=(",", ":"))
+            size = file.tell()
+        os.replace(tmp_path, self._cache_dir / "{0}.json".format(key))
+        self._quota.added(size)
+
+    def invalidate(self, dataset_hash):
+        prefix = "{0}_".format(dataset_hash)
+        with self._lock:
+            for key in [key for key in self._memory if key.startswith(prefix)]:
+                del self._memory[key]
+        for cache_file in self._cache_dir.glob("{0}*.json".format(prefix)):
+            cache_file.unlink(missing_ok=True)
+
+    def evict(self):
+        self._quota.evict()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({"memory_items": len(self._memory)})
+        requests = stats.get("memory_hits") + stats.get("disk_hits") + stats.get("misses")
+        stats.update({"hit_ratio": (stats.get("memory_hits") + stats.get("disk_hits")) / requests if requests else 0.0})
+        return stats
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._max_items:
+                self._memory.popitem(last=False)
@@ -0,0 +1,34 @@
+import gzip, hashlib, threading
+from collections import OrderedDict
+
+from visualization.VisualizeData import encode_json
+from visualization import Metrics
+
+
+class ChartPayloads():
+    # Chart payloads encoded once and kept in memory as plain and gzipped bytes with their ETag, keyed by
+    # the chart cache key. Requests are served from here without encoding or compressing again.
+    def __init__(self, max_items=512, compress_level=6):
+        self._max_items = max_items
+        self._compress_level = compress_level
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, payload, graph_type=""):
+        with Metrics.timed("encode_json", graph_type):
+            body = encode_json(payload)
+            entry = {"body": body, "gzip": gzip.compress(body, self._compress_level), "etag": hashlib.sha1(body).hexdigest()}
+        Metrics.observe_payload(graph_type, len(body))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_items:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
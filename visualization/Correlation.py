@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+
+class CorrelationStats():
+    # Pairwise-complete sufficient statistics of a numeric matrix: for every column pair (i, j), the number
+    # of rows where both are present, the sums and sums of squares of column i over those rows, and the
+    # cross products. Values are shifted by the first chunk's column means to keep the sums well conditioned.
+    # Everything is additive, so appended rows are added without touching the rows seen before.
+    def __init__(self, columns):
+        self._columns = list(columns)
+        k = len(self._columns)
+        self._shift = None
+        self._n = np.zeros((k, k))
+        self._sum = np.zeros((k, k))
+        self._sum_sq = np.zeros((k, k))
+        self._cross = np.zeros((k, k))
+        self._rows = 0
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @property
+    def rows(self):
+        return self._rows
+
+    def add(self, values):
+        values = np.asarray(values, dtype="float64")
+        if self._shift is None:
+            with np.errstate(all="ignore"):
+                self._shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(values.shape[1])
+        present = (~np.isnan(values)).astype("float64")
+        centered = np.nan_to_num(values - self._shift)
+        self._n += present.T @ present
+        self._sum += centered.T @ present
+        self._sum_sq += np.square(centered).T @ present
+        self._cross += centered.T @ centered
+        self._rows += len(values)
+        return self
+
+    def merge(self, other):
+        if other._columns != self._columns:
+            raise ValueError("Cannot merge correlation statistics over different columns.")
+        if other._shift is None:
+            return self
+        if self._shift is None:
+            self._shift = other._shift
+        # Move the other side's sums onto this side's shift before adding them.
+        delta = other._shift - self._shift
+        other_sum = other._sum + delta[:, None] * other._n
+        other_sum_sq = other._sum_sq + 2 * delta[:, None] * other._sum + np.square(delta)[:, None] * other._n
+        other_cross = other._cross + other._sum * delta[None, :] + other._sum.T * delta[:, None] + np.outer(delta, delta) * other._n
+        self._n += other._n
+        self._sum += other_sum
+        self._sum_sq += other_sum_sq
+        self._cross += other_cross
+        self._rows += other._rows
+        return self
+
+    def covariance(self, columns=None):
+        index = self._index(columns)
+        n, sums, sums_sq, cross = (matrix[np.ix_(index, index)] for matrix in (self._n, self._sum, self._sum_sq, self._cross))
+        with np.errstate(all="ignore"):
+            covariance = (cross - sums * sums.T / n) / (n - 1)
+            variance = (sums_sq - np.square(sums) / n) / (n - 1)
+        return covariance, variance
+
+    def pearson(self, columns=None):
+        covariance, variance = self.covariance(columns)
+        with np.errstate(all="ignore"):
+            correlation = covariance / np.sqrt(variance * variance.T)
+        return np.clip(correlation, -1.0, 1.0)
+
+    def _index(self, columns):
+        if columns is None:
+            return np.arange(len(self._columns))
+        positions = {column: position for position, column in enumerate(self._columns)}
+        return np.array([positions.get(column) for column in columns], dtype="intp")
+
+
+def correlation_matrix(df_numeric, method="pearson", stats=None):
+    # Pearson comes from the cached statistics when they are given, Spearman is Pearson over ranks and
+    # Kendall falls back to pandas. Spearman with missing values falls back too: every pair has to be ranked
+    # over its own complete rows, ranks of whole columns would not match.
+    if method == "pearson":
+        if stats is None:
+            stats = CorrelationStats(df_numeric.columns).add(df_numeric.to_numpy(dtype="float64"))
+        return stats.pearson(df_numeric.columns.to_list())
+    if method == "spearman" and not df_numeric.isna().to_numpy().any():
+        ranks = df_numeric.rank(method="average")
+        return CorrelationStats(ranks.columns).add(ranks.to_numpy(dtype="float64")).pearson()
+    return df_numeric.corr(method=method).to_numpy()
+
+
+def heatmap_triples(matrix, decimals=4):
+    k = matrix.shape[0]
+    rows, columns = np.indices((k, k))
+    values = np.round(matrix, decimals).ravel()
+    values = pd.Series(values).astype(object).where(~np.isnan(values), None).to_list()
+    return [list(cell) for cell in zip(rows.ravel().tolist(), columns.ravel().tolist(), values)]
@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from visualization import Metrics
+
+
+class DatasetIndex():
+    # Row indexes over a typed frame for drill-down filters. A categoric column keeps the row positions of
+    # every category (one stable argsort of the codes, so each category is a sorted run), numeric and datetime
+    # columns keep their row positions sorted by value, and a range is two binary searches. Every index is
+    # built the first time a filter uses its column and kept for the next queries.
+    def __init__(self, df_typed):
+        self._df = df_typed
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._df)
+
+    def index(self, column):
+        with self._lock:
+            index = self._indexes.get(column)
+            if index is None:
+                index = self.build_index(self._df.loc[:, column])
+                self._indexes[column] = index
+            return index
+
+    def build_index(self, column):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = column.cat.codes.to_numpy()
+            positions = np.argsort(codes, kind="stable")
+            counts = np.bincount(codes[codes >= 0], minlength=len(column.cat.categories))
+            bounds = np.concatenate(([0], np.cumsum(counts))) + np.count_nonzero(codes < 0)
+            return {"kind": "categoric", "categories": column.cat.categories, "codes": codes, "positions": positions, "bounds": bounds}
+        if pd.api.types.is_datetime64_any_dtype(column) or pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            kind = "datetime" if pd.api.types.is_datetime64_any_dtype(column) else "numeric"
+            values = column.to_numpy(dtype="datetime64[ns]" if kind == "datetime" else "float64")
+            # NaN and NaT sort last, they are cut off so no range ever matches them.
+            positions = np.argsort(values, kind="stable")
+            sorted_values = values[positions]
+            valid = np.count_nonzero(~pd.isna(sorted_values))
+            return {"kind": kind, "row_values": values, "values": sorted_values[:valid], "positions": positions[:valid]}
+        raise ValueError("Column {0} can not be filtered".format(column.name))
+
+    def resolve(self, predicate):
+        # Looks one predicate up in its index: {"column", "values": [...]} for categoric columns, {"column", "min",
+        # "max"} (both optional and inclusive) for numeric and datetime columns. Returns the index, the matching
+        # codes or value bounds, and the [start, stop) slices of the index positions that match.
+        column = predicate.get("column")
+        if column not in self._df.columns:
+            raise ValueError("Unknown column {0}".format(column))
+        index = self.index(column)
+        if index.get("kind") == "categoric":
+            if not isinstance(predicate.get("values"), list):
+                raise ValueError("Filter on {0} needs a list of values".format(column))
+            codes = index.get("categories").get_indexer(pd.Index(predicate.get("values")))
+            codes = np.unique(codes[codes >= 0])
+            bounds = index.get("bounds")
+            return {"index": index, "codes": codes, "slices": [(bounds[code], bounds[code + 1]) for code in codes]}
+        low, high = predicate.get("min"), predicate.get("max")
+        if index.get("kind") == "datetime":
+            low, high = (None if bound is None else pd.Timestamp(bound).to_datetime64() for bound in (low, high))
+        else:
+            low, high = (None if bound is None else float(bound) for bound in (low, high))
+        start = 0 if low is None else np.searchsorted(index.get("values"), low, side="left")
+        stop = len(index.get("values")) if high is None else np.searchsorted(index.get("values"), high, side="right")
+        return {"index": index, "low": low, "high": high, "slices": [(start, max(start, stop))]}
+
+    def positions(self, resolved):
+        # Sorted row positions matching a resolved predicate.
+        runs = [resolved.get("index").get("positions")[start:stop] for start, stop in resolved.get("slices")]
+        return np.sort(np.concatenate(runs)) if runs else np.empty(0, dtype="intp")
+
+    def contains(self, resolved, rows):
+        # Which of the given rows match a resolved predicate, checked on their own values only.
+        index = resolved.get("index")
+        if index.get("kind") == "categoric":
+            return np.isin(index.get("codes")[rows], resolved.get("codes"))
+        values = index.get("row_values")[rows]
+        matches = ~pd.isna(values)
+        if resolved.get("low") is not None:
+            matches &= values >= resolved.get("low")
+        if resolved.get("high") is not None:
+            matches &= values <= resolved.get("high")
+        return matches
+
+    def select(self, filters):
+        # Rows matching every filter. Match counts come from the indexes without touching any row, the most
+        # selective predicate gives the candidate rows and the others are only checked on those.
+        if not filters:
+            return np.arange(len(self._df))
+        resolved = sorted((self.resolve(predicate) for predicate in filters), key=lambda item: sum(stop - start for start, stop in item.get("slices")))
+        selected = self.positions(resolved[0])
+        for item in resolved[1:]:
+            selected = selected[self.contains(item, selected)]
+        return selected
+
+    def frame(self, filters):
+        return self._df.take(self.select(filters))
+
+
+class CrossFilter():
+    # Keeps the fully typed frame and its DatasetIndex of the last few datasets in memory, keyed by dataset
+    # content hash and column types, so a drill-down query reads and casts nothing and scans no column again.
+    def __init__(self, process, max_items=4):
+        self._process = process
+        self._max_items = max_items
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def dataset_index(self, file_path, user_file_and_types):
+        types = user_file_and_types.get("types")
+        key = (self._process.dataset_hash(file_path, user_file_and_types.get("sheet_name")), tuple(sorted(types.items())))
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                Metrics.count_lookup("dataset_index", "hit")
+                return index
+        Metrics.count_lookup("dataset_index", "miss")
+        df = self._process.read_file(file_path, user_file_and_types.get("sheet_name"), set(types))
+        with Metrics.timed("dataset_index"):
+            index = DatasetIndex(self._process.cast_datatypes(df, user_file_and_types, set(types)))
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self._max_items:
+                self._indexes.popitem(last=False)
+        return index
+
+    def query(self, file_path, user_file_and_types, filters):
+        # Typed frame of the rows matching every filter.
+        index = self.dataset_index(file_path, user_file_and_types)
+        with Metrics.timed("filter", rows=len(index)):
+            return index.frame(filters)
+
+    def invalidate(self, dataset_hash):
+        with self._lock:
+            for key in [key for key in self._indexes if key[0] == dataset_hash]:
+                del self._indexes[key]
@@ -0,0 +1,140 @@
+import json, os, sqlite3, threading, time, uuid, zlib
+from contextlib import contextmanager
+from pathlib import Path
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+LOCK_STRIPES = 256
+ACCESS_RESOLUTION_SECONDS = 60
+
+
+class DatasetRegistry():
+    # Maps dataset ids (kept in the user's session) to the uploaded file, its content hash, the user-defined
+    # column types and derived artifacts. State lives in SQLite so every worker process sees the same thing,
+    # and flock files give readers and writers of one dataset shared and exclusive access. A lock file is
+    # never unlinked, a process could hold a lock on the old inode while the next one locks a new file of
+    # the same name. Datasets are spread over LOCK_STRIPES files instead, so their number stays bounded.
+    def __init__(self, db_path, lock_dir, max_upload_bytes=2 * 1024**3):
+        self._db_path = Path(db_path)
+        self._lock_dir = Path(lock_dir)
+        self._lock_dir.mkdir(parents=True, exist_ok=True)
+        self._max_upload_bytes = max_upload_bytes
+        self._thread_locks = {}
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS datasets (dataset_id TEXT PRIMARY KEY, file_name TEXT, file_path TEXT, content_hash TEXT, types TEXT, created REAL, last_access REAL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS artifacts (dataset_id TEXT, name TEXT, value TEXT, PRIMARY KEY (dataset_id, name))")
+
+    def new_id(self):
+        return uuid.uuid4().hex
+
+    def register(self, dataset_id, file_name, file_path, content_hash):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, NULL, ?, ?)", (dataset_id, file_name, str(file_path), content_hash, now, now))
+        return dataset_id
+
+    def get(self, dataset_id):
+        if not dataset_id:
+            return None
+        with self._connect() as connection:
+            row = connection.execute("SELECT dataset_id, file_name, file_path, content_hash, types, last_access FROM datasets WHERE dataset_id = ?", (dataset_id,)).fetchone()
+            if row is None:
+                return None
+            # Every request reads its dataset, eviction only needs the access time to the minute.
+            now = time.time()
+            if row[5] is None or now - row[5] > ACCESS_RESOLUTION_SECONDS:
+                connection.execute("UPDATE datasets SET last_access = ? WHERE dataset_id = ?", (now, dataset_id))
+        return {"dataset_id": row[0], "file_name": row[1], "file_path": Path(row[2]), "content_hash": row[3], "types": json.loads(row[4]) if row[4] else None}
+
+    def set_types(self, dataset_id, column_types):
+        with self._connect() as connection:
+            connection.execute("UPDATE datasets SET types = ?, last_access = ? WHERE dataset_id = ?", (json.dumps(column_types), time.time(), dataset_id))
+
+    def hash_in_use(self, content_hash):
+        with self._connect() as connection:
+            row = connection.execute("SELECT 1 FROM datasets WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+        return row is not None
+
+    def set_artifact(self, dataset_id, name, value):
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)", (dataset_id, name, json.dumps(value)))
+
+    def get_artifact(self, dataset_id, name):
+        with self._connect() as connection:
+            row = connection.execute("SELECT value FROM artifacts WHERE dataset_id = ? AND name = ?", (dataset_id, name)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @contextmanager
+    def read_lock(self, dataset_id):
+        with self._lock(dataset_id, shared=True):
+            yield
+
+    @contextmanager
+    def write_lock(self, dataset_id):
+        with self._lock(dataset_id, shared=False):
+            yield
+
+    def evict(self, on_evict=None):
+        # Drops the least recently used uploads until the uploaded files fit in the quota. Datasets that
+        # someone is reading or writing right now are skipped.
+        with self._connect() as connection:
+            rows = connection.execute("SELECT dataset_id, file_path, content_hash FROM datasets ORDER BY last_access").fetchall()
+        sizes = {file_path: os.path.getsize(file_path) for _, file_path, _ in rows if os.path.exists(file_path)}
+        total_size = sum(sizes.values())
+        evicted = []
+        for dataset_id, file_path, content_hash in rows:
+            if total_size <= self._max_upload_bytes:
+                break
+            try:
+                with self._lock(dataset_id, shared=False, blocking=False):
+                    self.remove(dataset_id)
+                    total_size -= sizes.pop(file_path, 0)
+                    evicted.append((dataset_id, content_hash))
+            except BlockingIOError:
+                continue
+            if on_evict is not None:
+                on_evict(dataset_id, content_hash)
+        return evicted
+
+    def remove(self, dataset_id):
+        dataset = self.get(dataset_id)
+        if dataset is None:
+            return
+        with self._connect() as connection:
+            connection.execute("DELETE FROM datasets WHERE dataset_id = ?", (dataset_id,))
+            connection.execute("DELETE FROM artifacts WHERE dataset_id = ?", (dataset_id,))
+        Path(dataset.get("file_path")).unlink(missing_ok=True)
+
+    @contextmanager
+    def _lock(self, dataset_id, shared, blocking=True):
+        stripe = zlib.crc32(str(dataset_id).encode("utf8")) % LOCK_STRIPES
+        if fcntl is None:
+            # No flock on this platform, fall back to a lock shared by the threads of this process.
+            thread_lock = self._thread_locks.setdefault(stripe, threading.RLock())
+            if not thread_lock.acquire(blocking):
+                raise BlockingIOError("Dataset {0} is locked.".format(dataset_id))
+            try:
+                yield
+            finally:
+                thread_lock.release()
+            return
+        with open(self._lock_dir / "{0:03d}.lock".format(stripe), "a+") as lock_file:
+            flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+            fcntl.flock(lock_file, flags)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self._db_path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
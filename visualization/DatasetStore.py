@@ -0,0 +1,294 @@
+import pandas as pd
+
+import hashlib, json, os, shutil, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from visualization import Metrics
+from visualization.DiskQuota import DiskQuota
+from visualization.ReadChunks import CHUNK_ROWS, iter_chunks
+
+
+class RowFingerprint():
+    # Columns, row count and a sha256 over the row hashes of a dataset read chunk by chunk, and the largest
+    # stored dataset with the same columns whose rows are a strict prefix of its rows: the digest of each
+    # candidate's row count is checked as the rows pass it.
+    # Numbers are hashed as floats and datetimes in nanoseconds: a reader infers int64 for a column without
+    # gaps and float64 once appended rows leave a cell empty, the same values must still give the same fingerprint.
+    def __init__(self, columns, datasets):
+        self._columns = columns
+        self._datasets = datasets
+        self._sha = hashlib.sha256()
+        self._rows = 0
+        self._head = None
+        self._candidates = []
+        self._matches = []
+
+    def update(self, chunk):
+        normalized = {}
+        for column, values in chunk.items():
+            if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+                values = values.astype("float64")
+            elif pd.api.types.is_datetime64_any_dtype(values):
+                values = values.astype("datetime64[ns]")
+            normalized[column] = values
+        row_hashes = pd.util.hash_pandas_object(pd.DataFrame(normalized, copy=False), index=False).to_numpy()
+        if not len(row_hashes):
+            return
+        if self._head is None:
+            self._head = int(row_hashes[0])
+            self._candidates = [(entry.get("rows"), content_hash, entry.get("rows_hash")) for content_hash, entry in self._datasets.items()
+                                if entry.get("columns") == self._columns and entry.get("head") == self._head and entry.get("rows")]
+        for rows, content_hash, rows_hash in self._candidates:
+            if self._rows < rows <= self._rows + len(row_hashes):
+                sha = self._sha.copy()
+                sha.update(row_hashes[:rows - self._rows].tobytes())
+                if sha.hexdigest() == rows_hash:
+                    self._matches.append((rows, content_hash))
+        self._sha.update(row_hashes.tobytes())
+        self._rows += len(row_hashes)
+
+    def lineage(self):
+        base_rows, base = max((match for match in self._matches if match[0] < self._rows), default=(0, None))
+        return {"columns": self._columns, "rows": self._rows, "head": self._head, "rows_hash": self._sha.hexdigest(),
+                "base": base, "base_rows": base_rows}
+
+
+class DatasetStore():
+    # Uploaded files are parsed once and kept as feather files named by the sha256 of the upload.
+    # Later reads memory-map the feather file instead of running the parser again. The index also
+    # remembers the columns and a fingerprint of the rows of every stored dataset, so an upload that only
+    # appends rows to an earlier one is recognised as its extension (see base()).
+    def __init__(self, store_dir, max_size_bytes=2 * 1024**3, max_age_seconds=7 * 24 * 3600):
+        self._store_dir = Path(store_dir)
+        self._store_dir.mkdir(parents=True, exist_ok=True)
+        self._index_file = self._store_dir / "index.json"
+        self._thread_lock = threading.Lock()
+        self._max_age_seconds = max_age_seconds
+        self._quota = DiskQuota(self._store_dir, (".feather",), max_size_bytes, max_age_seconds)
+
+    def content_hash(self, file_path, chunk_size=1024 * 1024, sheet_name=None):
+        # Every worksheet of a workbook is its own dataset, a named sheet is hashed along with the file.
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                sha.update(chunk)
+        if sheet_name is not None:
+            sha.update("\0sheet\0{0}".format(sheet_name).encode("utf8"))
+        return sha.hexdigest()
+
+    def lookup(self, file_path, sheet_name=None):
+        # Re-hashing a 64 MB upload on every request is wasteful, the (size, mtime) pair tells us if it changed.
+        # A dataset evicted from the store is not found, put() parses the file again.
+        file_path = Path(file_path)
+        stat = file_path.stat()
+        entry = self._read_index().get("files", {}).get(self._file_key(file_path, sheet_name))
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime and self.dataset_path(entry.get("hash")) is not None:
+            return entry.get("hash")
+        return None
+
+    def put(self, file_path, dataframe=None, sheet_name=None, chunk_rows=CHUNK_ROWS):
+        # Files are read chunk by chunk (see ReadChunks) and every chunk goes to disk before the next one is
+        # parsed, so the memory an upload takes follows chunk_rows, not the file size.
+        file_path = Path(file_path)
+        content_hash = self.lookup(file_path, sheet_name) or self.content_hash(file_path, sheet_name=sheet_name)
+        if self.dataset_path(content_hash) is None:
+            Metrics.count_lookup("dataset_store", "miss")
+            chunks = iter_chunks(file_path, sheet_name, chunk_rows) if dataframe is None else [dataframe]
+            with Metrics.timed("ingest"):
+                lineage = self._write_chunks(chunks, content_hash)
+            Metrics.observe_dataset(file_path.stat().st_size, lineage.get("rows"))
+            stored_size = self.dataset_path(content_hash).stat().st_size
+        else:
+            Metrics.count_lookup("dataset_store", "hit")
+            lineage, stored_size = None, 0
+        self._remember(file_path, content_hash, lineage, sheet_name)
+        self._quota.added(stored_size)
+        return content_hash
+
+    def base(self, content_hash):
+        # (content hash, rows) of the stored dataset this one extends by appending rows, or None.
+        entry = self._read_index().get("datasets", {}).get(content_hash)
+        if entry is None or entry.get("base") is None:
+            return None
+        return entry.get("base"), entry.get("base_rows")
+
+    def get(self, content_hash, columns=None):
+        # The stored frame, or only the given columns of it (names it does not have are left out).
+        from pyarrow import feather
+        table = feather.read_table(self._used_path(content_hash), memory_map=True)
+        return table.select(self._present(table.schema.names, columns)).to_pandas()
+
+    def rows(self, content_hash):
+        # Row counts come from the record batch headers, the mapped column buffers are not touched.
+        from pyarrow import ipc, memory_map
+        reader = ipc.open_file(memory_map(str(self._used_path(content_hash))))
+        return sum(reader.get_batch(index).num_rows for index in range(reader.num_record_batches))
+
+    def iter_chunks(self, content_hash, columns=None, chunk_rows=CHUNK_ROWS, start=0):
+        # Frames of at most chunk_rows rows from row start on, sliced from the memory-mapped record batches
+        # of the feather file without copying them: a chunk costs the pandas conversion of its own rows and
+        # columns only. A dataset without rows after start still gives one empty frame.
+        from pyarrow import ipc, memory_map
+        reader = ipc.open_file(memory_map(str(self._used_path(content_hash))))
+        names = self._present(reader.schema.names, columns)
+        position, has_rows = 0, False
+        for index in range(reader.num_record_batches):
+            batch = reader.get_batch(index)
+            offset = max(start - position, 0)
+            position += batch.num_rows
+            if offset >= batch.num_rows:
+                continue
+            batch = batch.select(names)
+            for chunk_start in range(offset, batch.num_rows, chunk_rows):
+                has_rows = True
+                yield batch.slice(chunk_start, chunk_rows).to_pandas()
+        if not has_rows:
+            yield reader.schema.empty_table().select(names).to_pandas()
+
+    def dataset_path(self, content_hash):
+        dataset_path = self._store_dir / "{0}.feather".format(content_hash)
+        return dataset_path if dataset_path.exists() else None
+
+    def remove(self, content_hash):
+        dataset_path = self.dataset_path(content_hash)
+        if dataset_path is not None:
+            dataset_path.unlink()
+
+    def evict(self):
+        self._quota.evict()
+
+    def _used_path(self, content_hash):
+        dataset_path = self.dataset_path(content_hash)
+        if dataset_path is None:
+            raise KeyError("Dataset {0} is not in the store.".format(content_hash))
+        os.utime(dataset_path)
+        return dataset_path
+
+    def _present(self, names, columns):
+        return list(names) if columns is None else [name for name in names if name in columns]
+
+    def _write_chunks(self, chunks, content_hash):
+        # Every chunk is written to its own arrow file as it is parsed. The chunks of one file may disagree on
+        # a column's type (an int column gets a float chunk, a gap-only chunk has no type), so the feather file
+        # is only written at the end, one record batch per chunk, with one type per column over all chunks.
+        # Returns the lineage of the dataset.
+        from pyarrow import ipc, memory_map
+        parts_dir = self._store_dir / "{0}.{1}.parts".format(content_hash, os.getpid())
+        parts_dir.mkdir(exist_ok=True)
+        tmp_path = self._store_dir / "{0}.{1}.tmp".format(content_hash, os.getpid())
+        try:
+            parts, fingerprint = [], None
+            for chunk in chunks:
+                chunk = chunk.set_axis([str(column) for column in chunk.columns], axis=1).reset_index(drop=True)
+                if fingerprint is None:
+                    fingerprint = RowFingerprint(chunk.columns.to_list(), self._read_index().get("datasets", {}))
+                fingerprint.update(chunk)
+                table = self._arrow_table(chunk)
+                parts.append((parts_dir / "{0}.arrow".format(len(parts)), table.schema))
+                with ipc.new_file(str(parts[-1][0]), table.schema) as writer:
+                    writer.write_table(table)
+                del chunk, table
+            schema = self._unify_schemas([part_schema for _, part_schema in parts])
+            # Uncompressed, so reads map the column buffers straight from the file instead of decompressing them.
+            with ipc.new_file(str(tmp_path), schema) as writer:
+                for part_path, _ in parts:
+                    writer.write_table(ipc.open_file(memory_map(str(part_path))).read_all().cast(schema))
+            os.replace(tmp_path, self._store_dir / "{0}.feather".format(content_hash))
+        finally:
+            tmp_path.unlink(missing_ok=True)
+            shutil.rmtree(parts_dir, ignore_errors=True)
+        return fingerprint.lineage()
+
+    def _arrow_table(self, chunk):
+        # Object columns arrow can not type (numbers and text in one column) are stored as text.
+        import pyarrow as pa
+        try:
+            return pa.Table.from_pandas(chunk, preserve_index=False).replace_schema_metadata(None)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays = []
+            for column in chunk.columns:
+                try:
+                    arrays.append(pa.array(chunk.loc[:, column], from_pandas=True))
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    values = chunk.loc[:, column]
+                    arrays.append(pa.array(values.astype(str).where(values.notna(), None), from_pandas=True))
+            return pa.Table.from_arrays(arrays, names=chunk.columns.to_list())
+
+    def _unify_schemas(self, schemas):
+        # Per column: the one type of its chunks, ignoring chunks without values, float64 for mixed numbers and
+        # text for anything else.
+        import pyarrow as pa
+        fields = []
+        for position, name in enumerate(schemas[0].names):
+            types = []
+            for schema in schemas:
+                if schema.field(position).type != pa.null() and schema.field(position).type not in types:
+                    types.append(schema.field(position).type)
+            if not types:
+                field_type = pa.null()
+            elif len(types) == 1:
+                field_type = types[0]
+            elif all(pa.types.is_integer(item) or pa.types.is_floating(item) for item in types):
+                field_type = pa.float64()
+            elif all(pa.types.is_timestamp(item) for item in types):
+                field_type = pa.timestamp("ns")
+            else:
+                field_type = pa.string()
+            fields.append(pa.field(name, field_type))
+        return pa.schema(fields)
+
+    def _file_key(self, file_path, sheet_name=None):
+        file_key = str(Path(file_path).resolve())
+        return file_key if sheet_name is None else "{0}#{1}".format(file_key, sheet_name)
+
+    def _remember(self, file_path, content_hash, lineage=None, sheet_name=None):
+        # Workers storing uploads at the same time each re-read the index under the lock, no entry is lost.
+        stat = file_path.stat()
+        with self._index_lock():
+            self._write_index(file_path, stat, content_hash, lineage, sheet_name)
+
+    def _write_index(self, file_path, stat, content_hash, lineage=None, sheet_name=None):
+        now = time.time()
+        index = self._read_index()
+        files = index.setdefault("files", {})
+        files[self._file_key(file_path, sheet_name)] = {"path": str(Path(file_path).resolve()), "size": stat.st_size, "mtime": stat.st_mtime, "hash": content_hash}
+        # Entries of deleted uploads and of evicted datasets would never be looked up again.
+        index["files"] = {key: entry for key, entry in files.items()
+                          if os.path.exists(entry.get("path", key)) and self.dataset_path(entry.get("hash")) is not None}
+        datasets = index.setdefault("datasets", {})
+        if lineage is not None:
+            datasets[content_hash] = lineage
+        if content_hash in datasets:
+            datasets[content_hash]["time"] = now
+        # Lineage entries outlive the feather files, a dataset can be the base of the next upload after it was evicted.
+        index["datasets"] = {key: entry for key, entry in datasets.items() if now - entry.get("time", now) <= self._max_age_seconds}
+        tmp_path = self._store_dir / "index.{0}.{1}.tmp".format(os.getpid(), threading.get_ident())
+        with open(tmp_path, "w", encoding="utf8") as file:
+            json.dump(index, file)
+        os.replace(tmp_path, self._index_file)
+
+    @contextmanager
+    def _index_lock(self):
+        if fcntl is None:
+            # No flock on this platform, fall back to a lock shared by the threads of this process.
+            with self._thread_lock:
+                yield
+            return
+        with open(self._store_dir / "index.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            with open(self._index_file, encoding="utf8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
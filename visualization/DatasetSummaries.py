@@ -0,0 +1,63 @@
+import hashlib, json, os, pickle, threading
+from pathlib import Path
+
+from visualization import Metrics
+from visualization.DiskQuota import DiskQuota
+
+
+class DatasetSummaries():
+    # Mergeable summaries of a dataset (category counts and sums, histograms, correlation statistics, n-gram
+    # counters) pickled per (dataset content hash, column types, intermediate key) together with the number of
+    # rows they cover. When an upload extends a stored dataset, the summaries of the old version plus the new
+    # rows give the new version's summaries. Files are kept by age and total size, not with their dataset, so
+    # yesterday's summaries outlive yesterday's upload.
+    def __init__(self, summary_dir, max_disk_bytes=256 * 1024 * 1024, max_age_seconds=7 * 24 * 3600):
+        self._summary_dir = Path(summary_dir)
+        self._summary_dir.mkdir(parents=True, exist_ok=True)
+        self._quota = DiskQuota(self._summary_dir, (".pkl",), max_disk_bytes, max_age_seconds)
+
+    def key(self, dataset_hash, column_types, intermediate_key):
+        spec = json.dumps({"types": column_types, "key": intermediate_key}, sort_keys=True, default=str)
+        return "{0}_{1}".format(dataset_hash, hashlib.sha256(spec.encode("utf8")).hexdigest()[:32])
+
+    def get(self, dataset_hash, column_types, intermediate_key):
+        # Returns (rows, summary) or None.
+        summary_path = self._summary_dir / "{0}.pkl".format(self.key(dataset_hash, column_types, intermediate_key))
+        try:
+            with open(summary_path, "rb") as file:
+                entry = pickle.load(file)
+            os.utime(summary_path)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        return entry.get("rows"), entry.get("summary")
+
+    def put(self, dataset_hash, column_types, intermediate_key, rows, summary):
+        key = self.key(dataset_hash, column_types, intermediate_key)
+        tmp_path = self._summary_dir / "{0}.{1}.{2}.tmp".format(key, os.getpid(), threading.get_ident())
+        with open(tmp_path, "wb") as file:
+            pickle.dump({"rows": rows, "summary": summary}, file, protocol=pickle.HIGHEST_PROTOCOL)
+            size = file.tell()
+        os.replace(tmp_path, self._summary_dir / "{0}.pkl".format(key))
+        self._quota.added(size)
+
+    def evict(self):
+        self._quota.evict()
+
+    def summarize(self, dataset_hash, column_types, intermediate_key, rows, compute, merge_rows, base=None):
+        # Summary of the first `rows` rows: stored, merged from the base version's summary and the rows after
+        # it (base is (base hash, base rows)), or computed from scratch. merge_rows(summary, start) returns
+        # None when the summary can not take the rows, compute() then runs over all of them.
+        stored = self.get(dataset_hash, column_types, intermediate_key)
+        if stored is not None and stored[0] == rows:
+            Metrics.count_lookup("summaries", "hit")
+            return stored[1]
+        summary = None
+        if base is not None:
+            stored = self.get(base[0], column_types, intermediate_key)
+            if stored is not None and stored[0] == base[1] <= rows:
+                summary = merge_rows(stored[1], base[1])
+        Metrics.count_lookup("summaries", "miss" if summary is None else "merge")
+        if summary is None:
+            summary = compute()
+        self.put(dataset_hash, column_types, intermediate_key, rows, summary)
+        return summary
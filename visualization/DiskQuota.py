@@ -0,0 +1,49 @@
+import threading, time
+from pathlib import Path
+
+
+class DiskQuota():
+    # Keeps the files of a directory that every worker process writes to under a size quota and an optional
+    # age limit, least recently used first. A scan stats every file, so it does not run on every write: each
+    # process keeps the size its last scan found plus what it wrote since, and scans again once that passes
+    # the quota or the last scan is rescan_seconds old (the other processes write too). Files another process
+    # unlinks while a scan runs are skipped.
+    def __init__(self, directory, suffixes, max_bytes, max_age_seconds=None, rescan_seconds=60):
+        self._directory = Path(directory)
+        self._suffixes = tuple(suffixes)
+        self._max_bytes = max_bytes
+        self._max_age_seconds = max_age_seconds
+        self._rescan_seconds = rescan_seconds
+        self._size = None
+        self._scanned = 0.0
+        self._lock = threading.Lock()
+
+    def added(self, size):
+        # Called after writing a file of the given size, evicts when the directory may be over the quota.
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            due = self._size is None or self._size > self._max_bytes or time.monotonic() - self._scanned > self._rescan_seconds
+        if due:
+            self.evict()
+
+    def evict(self):
+        files = []
+        for path in self._directory.iterdir():
+            if not path.name.endswith(self._suffixes):
+                continue
+            try:
+                files.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+        files.sort(key=lambda item: item[0].st_mtime)
+        total_size = sum(stat.st_size for stat, _ in files)
+        now = time.time()
+        for stat, path in files:
+            expired = self._max_age_seconds is not None and now - stat.st_mtime > self._max_age_seconds
+            if not expired and total_size <= self._max_bytes:
+                break
+            total_size -= stat.st_size
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._size, self._scanned = total_size, time.monotonic()
@@ -0,0 +1,87 @@
+import heapq
+from collections import Counter
+
+
+def iter_ngrams(rows, ngram_range=(1, 2), min_token_length=2):
+    # Same tokens as CountVectorizer's default token_pattern, n-grams never cross a row boundary.
+    min_n, max_n = ngram_range
+    for row in rows:
+        tokens = [token for token in row.split() if len(token) >= min_token_length]
+        for n in range(min_n, max_n + 1):
+            if n == 1:
+                yield from tokens
+            else:
+                yield from (" ".join(tokens[start:start + n]) for start in range(len(tokens) - n + 1))
+
+
+def count_ngrams(rows, capacity=1000, ngram_range=(1, 2), exact=False):
+    counter = FrequencyCounter(capacity=capacity, ngram_range=ngram_range, exact=exact)
+    counter.update(rows)
+    return counter
+
+
+class FrequencyCounter():
+    # Space-Saving heavy hitters: at most `capacity` n-grams are kept whatever the vocabulary size.
+    # A new n-gram starts from `floor`, the largest count evicted so far, so every kept count is an
+    # upper bound and is off by at most `floor`. Counters built on different chunks or processes merge.
+    def __init__(self, capacity=1000, ngram_range=(1, 2), exact=False, chunk_size=10000):
+        self._capacity = capacity
+        self._ngram_range = tuple(ngram_range)
+        self._exact = exact
+        self._chunk_size = chunk_size
+        self._counts = {}
+        self._errors = {}
+        self._floor = 0
+
+    @property
+    def error_bound(self):
+        return self._floor
+
+    def update(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self._chunk_size:
+                self._add_counts(Counter(iter_ngrams(chunk, self._ngram_range)))
+                chunk = []
+        if chunk:
+            self._add_counts(Counter(iter_ngrams(chunk, self._ngram_range)))
+        return self
+
+    def merge(self, other):
+        if other._ngram_range != self._ngram_range:
+            raise ValueError("Cannot merge counters with different ngram ranges {0} and {1}.".format(self._ngram_range, other._ngram_range))
+        for term in other._counts.keys() - self._counts.keys():
+            self._counts[term] = self._floor
+            self._errors[term] = self._floor
+        for term in self._counts.keys() - other._counts.keys():
+            self._counts[term] += other._floor
+            self._errors[term] += other._floor
+        for term, count in other._counts.items():
+            self._counts[term] += count
+            self._errors[term] += other._errors.get(term, 0)
+        self._floor += other._floor
+        self._exact = self._exact and other._exact
+        self._prune()
+        return self
+
+    def most_common(self, top_k=100):
+        return heapq.nlargest(top_k, self._counts.items(), key=lambda item: item[1])
+
+    def _add_counts(self, counts):
+        for term, count in counts.items():
+            if term in self._counts:
+                self._counts[term] += count
+            else:
+                self._counts[term] = self._floor + count
+                self._errors[term] = self._floor
+        self._prune()
+
+    def _prune(self):
+        if self._exact or len(self._counts) <= self._capacity:
+            return
+        kept = dict(heapq.nlargest(self._capacity, self._counts.items(), key=lambda item: item[1]))
+        evicted = [count for term, count in self._counts.items() if term not in kept]
+        self._floor = max(self._floor, max(evicted))
+        self._errors = {term: self._errors.get(term, 0) for term in kept}
+        self._counts = kept
@@ -0,0 +1,129 @@
+import numpy as np
+
+
+BIN_RULES = ("auto", "fd", "scott", "rice", "sturges", "sqrt")
+
+
+def value_statistics(value_chunks):
+    # (min, max, count, standard deviation) of the values of every chunk, None when there are none. The bin
+    # rules only look at these, so a column read in chunks gets the bins of the same column read whole.
+    low, high, count, total, total_sq, shift = np.inf, -np.inf, 0, 0.0, 0.0, None
+    for values in value_chunks:
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if not values.size:
+            continue
+        if shift is None:
+            shift = values[0]
+        centered = values - shift
+        low, high = min(low, values.min()), max(high, values.max())
+        count += values.size
+        total += float(centered.sum())
+        total_sq += float(np.square(centered).sum())
+    if not count:
+        return None
+    return float(low), float(high), count, float(np.sqrt(max(total_sq / count - (total / count) ** 2, 0.0)))
+
+
+def histogram_edges(statistics, bins="fd", max_bins=200):
+    # bins is a fixed bin count, the edges themselves or a numpy rule name ("fd" for Freedman-Diaconis,
+    # "sturges", ...), statistics come from value_statistics(). The width rules take the spread from the
+    # standard deviation, "fd" uses the interquartile range of a normal distribution with it (1.349 deviations).
+    if np.ndim(bins):
+        return np.asarray(bins, dtype="float64")
+    if statistics is None:
+        return np.array([0.0, 1.0])
+    low, high, count, std = statistics
+    if isinstance(bins, str):
+        if bins not in BIN_RULES:
+            raise ValueError("Unknown bin rule {0}, use one of {1}".format(bins, ", ".join(BIN_RULES)))
+        value_span = high - low
+        sturges = np.log2(count) + 1
+        widths = {"scott": (24 * np.pi ** 0.5 / count) ** (1 / 3) * std, "fd": 2 * 1.349 * std * count ** (-1 / 3)}
+        if bins in ("rice", "sturges", "sqrt"):
+            bins = {"rice": 2 * count ** (1 / 3), "sturges": sturges, "sqrt": np.sqrt(count)}.get(bins)
+        elif bins == "auto":
+            # A heavy tail over a narrow spread asks for billions of bins, the count is capped below.
+            bins = max(value_span / widths.get("fd"), sturges) if widths.get("fd") > 0 else sturges
+        else:
+            bins = value_span / widths.get(bins) if widths.get(bins) > 0 else 1
+        bins = int(np.ceil(bins))
+    bins = min(max(int(bins), 1), max_bins)
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+class Histogram():
+    # Counts over fixed edges plus the count, sum and sum of squares of the values. Everything is additive,
+    # so histograms of chunks or of separate processes merge as long as they share the edges.
+    def __init__(self, edges):
+        self._edges = np.asarray(edges, dtype="float64")
+        self._counts = np.zeros(len(self._edges) - 1, dtype="int64")
+        self._n = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._outside = 0
+
+    @classmethod
+    def from_values(cls, values, bins="fd"):
+        histogram = cls(histogram_edges(value_statistics([values]), bins))
+        histogram.add(values)
+        return histogram
+
+    @property
+    def edges(self):
+        return self._edges
+
+    @property
+    def counts(self):
+        return self._counts
+
+    def add(self, values):
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        counts, _ = np.histogram(values, bins=self._edges)
+        self._counts += counts
+        self._outside += values.size - int(counts.sum())
+        self._n += values.size
+        self._sum += float(values.sum())
+        self._sum_sq += float(np.square(values).sum())
+        return self
+
+    def merge(self, other):
+        if not np.array_equal(self._edges, other._edges):
+            raise ValueError("Cannot merge histograms with different bin edges.")
+        self._counts += other._counts
+        self._outside += other._outside
+        self._n += other._n
+        self._sum += other._sum
+        self._sum_sq += other._sum_sq
+        return self
+
+    def density(self):
+        binned = self._counts.sum()
+        if binned == 0:
+            return np.zeros(len(self._counts))
+        return self._counts / (binned * np.diff(self._edges))
+
+    def kde(self, grid_size=200):
+        # Gaussian KDE over the bin centers weighted by their counts, bandwidth from Scott's rule.
+        centers = (self._edges[:-1] + self._edges[1:]) / 2
+        grid = np.linspace(self._edges[0], self._edges[-1], grid_size)
+        binned = self._counts.sum()
+        if binned == 0 or self._n < 2:
+            return grid, np.zeros(grid_size)
+        variance = max(self._sum_sq / self._n - (self._sum / self._n) ** 2, 0.0)
+        bandwidth = 1.06 * np.sqrt(variance) * self._n ** (-1 / 5)
+        if bandwidth == 0:
+            bandwidth = float(np.diff(self._edges).mean())
+        weights = self._counts / binned
+        kernel = np.exp(-0.5 * np.square((grid[:, None] - centers[None, :]) / bandwidth))
+        return grid, kernel @ weights / (bandwidth * np.sqrt(2 * np.pi))
+
+    def to_dict(self, density=False, kde=False):
+        data_histogram = {"bins": self._edges.tolist(), "data": (self.density() if density else self._counts).tolist(), "density": density}
+        if kde:
+            grid, kde_values = self.kde()
+            data_histogram.update({"kde": {"x": grid.tolist(), "y": kde_values.tolist()}})
+        return data_histogram
@@ -0,0 +1,106 @@
+import json, os, sqlite3, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class JobQueue():
+    # Runs chart requests in the background on a local worker pool, so the web request only submits the
+    # job and returns. Job and per-chart state live in SQLite, every worker process can answer progress
+    # polls and take cancel requests for a job no matter which process runs it.
+    def __init__(self, db_path, max_workers=2, max_age_seconds=24 * 3600):
+        self._db_path = Path(db_path)
+        self._max_age_seconds = max_age_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, dataset_id TEXT, status TEXT, error TEXT, pid INTEGER, created REAL, finished REAL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS job_charts (job_id TEXT, position INTEGER, graph TEXT, status TEXT, json_name TEXT, chart_key TEXT, PRIMARY KEY (job_id, position))")
+
+    def submit(self, dataset_id, graph_types_list, work):
+        # work(job_id, on_chart, cancelled) builds the charts, calling on_chart(position, json_name, chart_key)
+        # as each one finishes (json_name None when the graph does not fit the columns).
+        job_id = uuid.uuid4().hex
+        with self._connect() as connection:
+            connection.execute("INSERT INTO jobs VALUES (?, ?, 'queued', NULL, ?, ?, NULL)", (job_id, dataset_id, os.getpid(), time.time()))
+            connection.executemany("INSERT INTO job_charts VALUES (?, ?, ?, 'queued', NULL, NULL)",
+                                   [(job_id, position, json.dumps(graph)) for position, graph in enumerate(graph_types_list)])
+        self._pool.submit(self._run, job_id, work)
+        self.expire()
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as connection:
+            job = connection.execute("SELECT job_id, dataset_id, status, error, created, finished, pid FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            if job[2] in ("queued", "running") and not self._is_alive(job[6]):
+                # The process that owned the pool died with the job, nobody is going to finish it.
+                connection.execute("UPDATE jobs SET status = 'failed', error = 'Worker process exited.', finished = ? WHERE job_id = ?", (time.time(), job_id))
+                connection.execute("UPDATE job_charts SET status = 'failed' WHERE job_id = ? AND status IN ('queued', 'running')", (job_id,))
+                job = connection.execute("SELECT job_id, dataset_id, status, error, created, finished, pid FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            charts = connection.execute("SELECT position, graph, status, json_name, chart_key FROM job_charts WHERE job_id = ? ORDER BY position", (job_id,)).fetchall()
+        charts = [{"position": position, "graph": json.loads(graph), "status": status, "json_name": json_name, "chart_key": chart_key}
+                  for position, graph, status, json_name, chart_key in charts]
+        done = sum(chart.get("status") in ("done", "skipped") for chart in charts)
+        return {"job_id": job[0], "dataset_id": job[1], "status": job[2], "error": job[3], "created": job[4], "finished": job[5],
+                "progress": done / len(charts) if charts else 1.0, "charts": charts}
+
+    def cancel(self, job_id):
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE job_id = ? AND status IN ('queued', 'running')", (time.time(), job_id))
+            connection.execute("UPDATE job_charts SET status = 'cancelled' WHERE job_id = ? AND status IN ('queued', 'running')", (job_id,))
+
+    def is_cancelled(self, job_id):
+        with self._connect() as connection:
+            row = connection.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row is None or row[0] == "cancelled"
+
+    def expire(self):
+        # Forgets jobs older than max_age_seconds, unless they are still running in a live process.
+        with self._connect() as connection:
+            rows = connection.execute("SELECT job_id, status, pid, created FROM jobs").fetchall()
+            expired = [job_id for job_id, status, pid, created in rows
+                       if time.time() - created > self._max_age_seconds and (status not in ("queued", "running") or not self._is_alive(pid))]
+            connection.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in expired])
+            connection.executemany("DELETE FROM job_charts WHERE job_id = ?", [(job_id,) for job_id in expired])
+        return expired
+
+    def _run(self, job_id, work):
+        if self.is_cancelled(job_id):
+            return
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = 'running' WHERE job_id = ? AND status = 'queued'", (job_id,))
+            connection.execute("UPDATE job_charts SET status = 'running' WHERE job_id = ? AND status = 'queued'", (job_id,))
+        try:
+            work(job_id, lambda position, json_name, chart_key: self._chart_done(job_id, position, json_name, chart_key), lambda: self.is_cancelled(job_id))
+        except Exception as error:
+            with self._connect() as connection:
+                connection.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE job_id = ? AND status = 'running'", (str(error), time.time(), job_id))
+                connection.execute("UPDATE job_charts SET status = 'failed' WHERE job_id = ? AND status = 'running'", (job_id,))
+            return
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = 'done', finished = ? WHERE job_id = ? AND status = 'running'", (time.time(), job_id))
+
+    def _chart_done(self, job_id, position, json_name, chart_key):
+        with self._connect() as connection:
+            connection.execute("UPDATE job_charts SET status = ?, json_name = ?, chart_key = ? WHERE job_id = ? AND position = ? AND status = 'running'",
+                               ("done" if json_name else "skipped", json_name, chart_key, job_id, position))
+
+    def _is_alive(self, pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self._db_path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
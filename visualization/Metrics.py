@@ -0,0 +1,81 @@
+import contextvars, os, time
+from contextlib import contextmanager
+import prometheus_client
+
+
+ROW_BOUNDS = (1000, 10000, 100000, 1000000)
+COLUMN_BOUNDS = (5, 10, 50, 100)
+
+# Rows and columns are bucketed before they become labels, one series per exact size would never stop growing.
+STAGE_SECONDS = prometheus_client.Histogram("visualize_stage_seconds", "Time spent in each pipeline stage.", ["stage", "graph_type", "rows", "columns"],
+                                            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+DATASET_BYTES = prometheus_client.Histogram("visualize_dataset_bytes", "Size of the uploaded files.", buckets=(1e4, 1e5, 1e6, 1e7, 1e8, 1e9))
+DATASET_ROWS = prometheus_client.Histogram("visualize_dataset_rows", "Rows of the uploaded datasets.", buckets=(1e2, 1e3, 1e4, 1e5, 1e6, 1e7))
+PAYLOAD_BYTES = prometheus_client.Histogram("visualize_payload_bytes", "Size of the encoded chart payloads.", ["graph_type"], buckets=(1e2, 1e3, 1e4, 1e5, 1e6, 1e7))
+CACHE_LOOKUPS = prometheus_client.Counter("visualize_cache_lookups", "Cache lookups by cache and result.", ["cache", "result"])
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def size_label(value, bounds):
+    if value is None:
+        return ""
+    for bound in bounds:
+        if value <= bound:
+            return "<={0}".format(bound)
+    return ">{0}".format(bounds[-1])
+
+
+@contextmanager
+def timed(stage, graph_type="", rows=None, columns=None):
+    # Observes the stage duration, and adds it to the timing breakdown of the current request if one is collected.
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage, graph_type, size_label(rows, ROW_BOUNDS), size_label(columns, COLUMN_BOUNDS)).observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append(("{0}_{1}".format(stage, graph_type) if graph_type else stage, seconds))
+
+
+def observe_dataset(size_bytes, rows):
+    DATASET_BYTES.observe(size_bytes)
+    DATASET_ROWS.observe(rows)
+
+
+def observe_payload(graph_type, size_bytes):
+    PAYLOAD_BYTES.labels(graph_type).observe(size_bytes)
+
+
+def count_lookup(cache, result):
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def start_request():
+    # Threads that should report into the request's breakdown must run in a copy of the caller's context.
+    _request_timings.set([])
+
+
+def request_timings():
+    # Total seconds per stage for the current request, in the order the stages first finished.
+    totals = {}
+    for name, seconds in _request_timings.get() or []:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return totals
+
+
+def server_timing(timings):
+    # Server-Timing header value, browsers show it next to the request in their developer tools.
+    return ", ".join("{0};dur={1:.1f}".format(name.replace(" ", "_"), seconds * 1000) for name, seconds in timings.items())
+
+
+def latest():
+    # Under several worker processes (PROMETHEUS_MULTIPROC_DIR set) the samples of all of them are merged.
+    registry = prometheus_client.REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
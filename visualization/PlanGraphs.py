@@ -0,0 +1,205 @@
+import contextvars, os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from visualization import Metrics
+from visualization.CategoryAggregates import AGGREGATIONS, CategoryAggregates
+from visualization.Correlation import CorrelationStats
+from visualization.Histogram import Histogram, histogram_edges
+
+
+# Intermediates that are mergeable summaries, stored per dataset and extended with appended rows.
+SUMMARY_KINDS = ("categories", "histogram", "correlation_stats", "ngrams")
+
+
+class PlanGraphs():
+    # Turns the requested graph list into chart jobs and the intermediates they depend on (category
+    # aggregates, histograms, correlation statistics, n-gram counters, sorted time frames). Every distinct
+    # intermediate is computed once and the chart builds run concurrently on a thread pool, so a dashboard
+    # costs about as much as its slowest chart. With a DatasetSummaries store, the mergeable intermediates
+    # are kept per dataset, and for an upload that appends rows to an earlier one (base) only the new rows
+    # are summarized and merged into the earlier summaries. Given the dataset's TypedChunks, the mergeable
+    # intermediates are folded over its chunks instead, and df_typed only has to hold what the others read.
+    def __init__(self, process, visualizer, max_workers=None, summaries=None):
+        self._process = process
+        self._visualizer = visualizer
+        self._max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self._summaries = summaries
+
+    def run(self, df_typed, graph_types_list, dataset_key=None, on_chart=None, cancelled=None, column_types=None, base=None, chunks=None):
+        frames = self.frames(df_typed)
+        # One (json file name, payload) pair per requested graph, None for graphs that do not fit the columns.
+        jobs = [self.plan_graph(graph, frames) for graph in graph_types_list]
+        requirements = []
+        for job in jobs:
+            if job is not None:
+                requirements.extend(key for key in job[1] if key not in requirements)
+
+        size = {"rows": len(df_typed) if chunks is None else chunks.rows, "columns": len(df_typed.columns)}
+        scope = None
+        if self._summaries is not None and dataset_key is not None and column_types is not None:
+            scope = {"dataset_key": dataset_key, "column_types": column_types, "base": base}
+        with ThreadPoolExecutor(max_workers=self._max_workers) as pool:
+            # Intermediates go into the queue first, so a build waiting on one never holds back its computation.
+            # Every task runs in a copy of the caller's context so its timings land in the caller's request.
+            intermediates = {key: pool.submit(contextvars.copy_context().run, self._intermediate, df_typed, key, graph_types_list, size, scope, chunks) for key in requirements}
+            builds = [None if job is None else (job[0], pool.submit(contextvars.copy_context().run, self._build, job[2], job[1], intermediates, graph.get("type"), size))
+                      for graph, job in zip(graph_types_list, jobs)]
+            if on_chart is not None:
+                # Reports every chart as soon as its build finishes, and drops the builds that have not
+                # started yet once the caller cancels.
+                for index, build in enumerate(builds):
+                    if build is None:
+                        on_chart(index, None)
+                positions = {build[1]: index for index, build in enumerate(builds) if build is not None}
+                for future in as_completed(positions):
+                    if cancelled is not None and cancelled():
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        return [None] * len(builds)
+                    index = positions.get(future)
+                    on_chart(index, (builds[index][0], future.result()))
+            return [None if build is None else (build[0], build[1].result()) for build in builds]
+
+    def frames(self, df_typed):
+        return {
+            "typed": df_typed,
+            "categoric": self._process.process_categorical(df_typed),
+            "numeric": self._process.process_numeric(df_typed),
+            "datetime": self._process.process_datetime(df_typed),
+            "text": self._process.select_columns(df_typed, pd.api.types.is_object_dtype),
+        }
+
+    def needs_rows(self, df_typed, graph_types_list):
+        # Whether any of the graphs reads the typed frame itself rather than intermediates folded over chunks.
+        frames = self.frames(df_typed)
+        for job in (self.plan_graph(graph, frames) for graph in graph_types_list):
+            if job is not None and (not job[1] or any(not self.is_summary(key) for key in job[1])):
+                return True
+        return False
+
+    def is_summary(self, key):
+        # Medians need every value of a category, those aggregates are not merged.
+        return key[0] in SUMMARY_KINDS and not (key[0] == "categories" and key[3])
+
+    def plan_graph(self, graph, frames):
+        # Returns (json file name, intermediate keys, build function) or None when the graph does not fit the columns.
+        visualizer = self._visualizer
+        categoric, numeric, datetime, text = (frames.get(name).columns for name in ("categoric", "numeric", "datetime", "text"))
+        df_categoric, df_numeric = frames.get("categoric"), frames.get("numeric")
+        graph_type = graph.get("type")
+        if graph_type == "pieplot":
+            cat_col = graph.get("categoric_col_name")
+            if cat_col in categoric:
+                return "data_pieplot", [("categories", cat_col, None, False)], lambda counts: visualizer.prepare_pieplot(df_categoric, cat_col, counts, graph.get("top_k", 20))
+        elif graph_type == "barplot":
+            cat_col, num_col = graph.get("categoric_col_name", graph.get("x")), graph.get("numeric_col_name")
+            aggregations = graph.get("aggregations") or [graph.get("aggregation", "mean")]
+            if cat_col in categoric:
+                if num_col in numeric and all(aggregation in AGGREGATIONS for aggregation in aggregations):
+                    return "data_barplot_xy", [("categories", cat_col, num_col, "median" in aggregations)], lambda aggregates: visualizer.prepare_barplot(frames.get("typed"), cat_col, num_col, aggregates=aggregates, aggregations=aggregations, top_k=graph.get("top_k", 50))
+                elif not num_col:
+                    return "data_barplot_x", [("categories", cat_col, None, False)], lambda counts: visualizer.prepare_barplot(df_categoric, cat_col, counts=counts, top_k=graph.get("top_k", 50))
+        elif graph_type == "scatterplot":
+            num_col_1, num_col_2 = graph.get("num_col_name_1"), graph.get("num_col_name_2")
+            if num_col_1 in numeric and num_col_2 in numeric:
+                return "data_scatter_xy", [], lambda: visualizer.prepare_scatterplot(df_numeric, num_col_1, num_col_2, graph.get("max_points", 5000), graph.get("mode", "sample"))
+        elif graph_type == "timeplot":
+            x, y = graph.get("x"), graph.get("y")
+            if x in datetime and y in numeric:
+                return "data_timeplot_xy", [("time_frame", x)], lambda df_time: visualizer.prepare_timeplot(df_time, x, y, granularity=graph.get("granularity"), aggregation=graph.get("aggregation", "mean"), max_points=graph.get("max_points", 1000))
+        elif graph_type == "boxplot":
+            box_columns = [graph.get("x")] if isinstance(graph.get("x"), str) else graph.get("x") or []
+            group_by = graph.get("group_by")
+            if box_columns and all(column in numeric for column in box_columns) and (group_by is None or group_by in categoric):
+                return "data_boxplot_x", [], lambda: visualizer.prepare_boxplot(frames.get("typed"), box_columns, group_by)
+        elif graph_type == "correlation":
+            correlation_columns = [column for column in graph.get("columns", numeric) if column in numeric]
+            if graph.get("method", "pearson") == "pearson":
+                # Statistics over every numeric column, any column subset is read from them.
+                return "data_correlation", [("correlation_stats", tuple(numeric))], lambda stats: visualizer.prepare_correlation(df_numeric, correlation_columns, stats=stats)
+            return "data_correlation", [], lambda: visualizer.prepare_correlation(df_numeric, correlation_columns, graph.get("method"))
+        elif graph_type == "histogram":
+            bins = tuple(graph.get("bins")) if isinstance(graph.get("bins"), list) else graph.get("bins", "fd")
+            if graph.get("x") in numeric:
+                return "data_histogram_x", [("histogram", graph.get("x"), bins)], lambda histogram: visualizer.prepare_histogram(df_numeric, graph.get("x"), bins, graph.get("density", False), graph.get("kde", False), histogram)
+        elif graph_type == "wordcloud":
+            top_k = graph.get("top_k", 100)
+            if graph.get("x") in text:
+                return "data_wordcloud_x", [("ngrams", graph.get("x"), bool(graph.get("stem")), top_k)], lambda counter: visualizer.prepare_wordcloud(None, graph.get("x"), top_k, counter=counter)
+        return None
+
+    def compute_intermediate(self, df_typed, key, graph_types_list):
+        if key[0] == "categories":
+            # Counts, and sums and medians of the numeric column if any, for every pie and bar chart of the column.
+            return CategoryAggregates(df_typed.loc[:, key[1]], None if key[2] is None else df_typed.loc[:, key[2]])
+        elif key[0] == "histogram":
+            return Histogram.from_values(df_typed.loc[:, key[1]].to_numpy(dtype="float64"), key[2])
+        elif key[0] == "correlation_stats":
+            return CorrelationStats(key[1]).add(df_typed.loc[:, list(key[1])].to_numpy(dtype="float64"))
+        elif key[0] == "ngrams":
+            rows = self._process.process_text(df_typed, [key[1]], stem=key[2]).get(key[1])
+            return self._visualizer.word_counter(rows, key[3])
+        elif key[0] == "time_frame":
+            numeric_cols = self._process.process_numeric(df_typed).columns.to_list()
+            df_time = df_typed.loc[:, [key[1]] + numeric_cols].dropna(subset=[key[1]])
+            df_time.set_index(key[1], inplace=True)
+            df_time.sort_index(inplace=True)
+            return df_time
+        raise KeyError("Unknown intermediate {0}".format(key))
+
+    def merge_rows(self, summary, df_new, key, dataset_rows):
+        # Adds the rows of df_new to the summary of the rows before them, dataset_rows is the row count of the whole
+        # dataset. None when the summary can not take them: a histogram's bins are fixed, values past the edges
+        # a bin rule laid over the earlier rows need new ones (given edges stay, the values are counted outside).
+        if key[0] == "categories":
+            return summary.merge(CategoryAggregates(df_new.loc[:, key[1]], None if key[2] is None else df_new.loc[:, key[2]]))
+        elif key[0] == "histogram":
+            values = df_new.loc[:, key[1]].to_numpy(dtype="float64")
+            values = values[~np.isnan(values)]
+            if not np.ndim(key[2]) and values.size and (values.min() < summary.edges[0] or values.max() > summary.edges[-1]):
+                return None
+            return summary.add(values)
+        elif key[0] == "correlation_stats":
+            return summary.add(df_new.loc[:, list(key[1])].to_numpy(dtype="float64"))
+        elif key[0] == "ngrams":
+            rows = self._process.process_text(df_new, [key[1]], stem=key[2]).get(key[1])
+            return summary.merge(self._visualizer.word_counter(rows, key[3], exact=dataset_rows <= 10000))
+        return None
+
+    def fold_chunks(self, chunks, key, start=0, summary=None):
+        # The summary of the dataset's rows from start on, added to the given summary of the rows before, one
+        # chunk at a time. A histogram's bins come from statistics over all values of its column, like on the
+        # whole typed frame.
+        columns = list(key[1]) if key[0] == "correlation_stats" else [column for column in key[1:3] if isinstance(column, str)]
+        for chunk in chunks.iter(start, columns):
+            if summary is None and key[0] == "histogram":
+                summary = Histogram(histogram_edges(chunks.value_statistics(key[1]), key[2]))
+            elif summary is None and key[0] == "correlation_stats":
+                summary = CorrelationStats(key[1])
+            elif summary is None:
+                summary = self.compute_intermediate(chunk, key, None)
+                continue
+            summary = self.merge_rows(summary, chunk, key, chunks.rows)
+            if summary is None:
+                return None
+        return summary
+
+    def _intermediate(self, df_typed, key, graph_types_list, size, scope=None, chunks=None):
+        with Metrics.timed("intermediate", key[0], **size):
+            if chunks is not None and self.is_summary(key):
+                compute = lambda: self.fold_chunks(chunks, key)
+                merge_rows = lambda summary, start: self.fold_chunks(chunks, key, start, summary)
+            else:
+                compute = lambda: self.compute_intermediate(df_typed, key, graph_types_list)
+                merge_rows = lambda summary, start: self.merge_rows(summary, df_typed.iloc[start:], key, len(df_typed))
+            if scope is None or not self.is_summary(key):
+                return compute()
+            return self._summaries.summarize(scope.get("dataset_key"), scope.get("column_types"), key, size.get("rows"),
+                                             compute, merge_rows, scope.get("base"))
+
+    def _build(self, build, required, intermediates, graph_type, size):
+        # Only the build itself is timed, not the wait for its intermediates.
+        arguments = [intermediates.get(key).result() for key in required]
+        with Metrics.timed("prepare", graph_type, **size):
+            return build(*arguments)
@@ -1,74 +1,230 @@
-
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
-from wordcloud import WordCloud
-from sklearn.feature_extraction.text import CountVectorizer
-from nltk import FreqDist, word_tokenize, RegexpTokenizer, stem
-from snowballstemmer import TurkishStemmer
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    from pandas._libs.tslibs.parsing import guess_datetime_format
 
-import time
+import re, warnings
 from string import punctuation
-from pathlib import Path
-from utils.paths import get_visualization_folder
+from utils.paths import get_visualization_folder, get_store_folder
+from visualization.DatasetStore import DatasetStore
+from visualization.ReadChunks import CHUNK_ROWS, file_format, iter_chunks, sheet_names
+from visualization.ProcessText import ProcessText
+from visualization import Metrics
+
+
+STOPWORD_FILES = {"turkish": "data/stopwords_tr.txt", "english": "data/stopwords_en.txt"}
+YEAR_FIRST = re.compile(r"\d{4}[-/.]\d{1,2}[-/.]\d{1,2}")
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$")
 
 
 class ProcessData():
-    def __init__(self):
+    # NLTK, snowballstemmer and openpyxl are imported where they are used, and stopword sets, stemmers and the
+    # text processor are built on first use. Most requests never touch text, a worker should not pay for it at start.
+    def __init__(self, store_dir=None):
         # print("Class INITIATED with cwd: {}".format(Path.cwd()))
-        self._stopwords_tr = self.read_stopwords(get_visualization_folder() / "data/stopwords_tr.txt")
-        self._stopwords_en = self.read_stopwords(get_visualization_folder() / "data/stopwords_en.txt")
-        self._stemmer_en = stem.SnowballStemmer('english')
-        self._stemmer_tr = TurkishStemmer()
+        self._stopwords = {}
+        self._stemmers = {}
+        self._store = DatasetStore(store_dir or get_store_folder())
+        self._text_processor = None
 
-    def read_file(self, excel_file_path):
-        try:
-            # t0 = time.time()
-            df = pd.read_excel(excel_file_path)
-            # print("UPLOADED File {0} Read Time: {1:.5f} sec.".format(excel_file_path, time.time() - t0))
-            return df
-        except Exception as error:
-            return error
+    def stopwords(self, language):
+        if language not in self._stopwords:
+            self._stopwords[language] = self.read_stopwords(get_visualization_folder() / STOPWORD_FILES.get(language))
+        return self._stopwords.get(language)
+
+    def stemmer(self, language):
+        # Returns a function stemming a list of tokens.
+        if language not in self._stemmers:
+            if language == "turkish":
+                from snowballstemmer import TurkishStemmer
+                self._stemmers[language] = TurkishStemmer().stemWords
+            elif language == "english":
+                from nltk.stem.snowball import SnowballStemmer
+                stemmer_en = SnowballStemmer("english")
+                self._stemmers[language] = lambda tokens: [stemmer_en.stem(token) for token in tokens]
+        return self._stemmers.get(language)
+
+    def text_processor(self):
+        if self._text_processor is None:
+            stopwords_by_language = {language: self.stopwords(language) for language in STOPWORD_FILES}
+            stemmers = {language: (lambda tokens, language=language: self.stemmer(language)(tokens)) for language in STOPWORD_FILES}
+            self._text_processor = ProcessText(stopwords_by_language, stemmers)
+        return self._text_processor
+
+    def read_file(self, file_path, sheet_name=None, columns=None):
+        # The whole stored frame, or only the given columns. Unreadable files and missing sheets raise.
+        with Metrics.timed("read_file"):
+            return self._store.get(self.dataset_hash(file_path, sheet_name), columns)
+
+    def read_chunks(self, file_path, sheet_name=None, columns=None, chunk_rows=CHUNK_ROWS, start=0):
+        # The stored rows from start on, chunk_rows at a time.
+        return self._store.iter_chunks(self.dataset_hash(file_path, sheet_name), columns, chunk_rows, start)
+
+    def dataset_rows(self, file_path, sheet_name=None):
+        return self._store.rows(self.dataset_hash(file_path, sheet_name))
+
+    def dataset_hash(self, file_path, sheet_name=None):
+        return self._store.lookup(file_path, sheet_name) or self._store.put(file_path, sheet_name=sheet_name)
+
+    def dataset_base(self, file_path, sheet_name=None):
+        # (content hash, rows) of the earlier upload this file only appends rows to, or None.
+        return self._store.base(self.dataset_hash(file_path, sheet_name))
+
+    def store_file(self, file_path, sheet_name=None):
+        # Called right after the upload so the parse is paid once, not on the first visualize request.
+        return self._store.put(file_path, sheet_name=sheet_name)
+
+    def sheet_names(self, file_path):
+        return sheet_names(file_path)
     
-    def cast_datatypes(self, dataframe, user_selected_types):
+    def cast_datatypes(self, dataframe, user_selected_types, columns=None):
+        # Builds the typed frame in one pass, one new array per cast column. Columns that are not needed
+        # by the requested graphs are skipped and missing values are handled per column, not by dropping rows.
         types = user_selected_types.get("types")
-        df_copy = dataframe.copy().dropna()
-        for col_name, col_type in types.items():
-            if col_type == "text":
+        typed_columns = {}
+        selected = [col_name for col_name in dataframe.columns if columns is None or col_name in columns]
+        with Metrics.timed("cast_datatypes", rows=len(dataframe), columns=len(selected)):
+            for col_name in selected:
+                col_type = types.get(col_name)
                 try:
-                    df_copy.loc[:, col_name] = df_copy.loc[:, col_name].astype(dtype={col_name:"object"})
-                except Exception as error:
-                    raise TypeError("Could not convert {name} column to {dtype}. Detail: {err}".format(name=col_name, dtype=col_type, err=error))
-            elif col_type == "categoric":
-                try:
-                    df_copy.loc[:, col_name] = df_copy.loc[:, col_name].astype(dtype={col_name:"category"})
-                except Exception as error:
-                    raise TypeError("Could not convert {name} column to {dtype}. Detail: {err}".format(name=col_name, dtype=col_type, err=error))
-            elif col_type == "numeric":
-                try:
-                    df_copy.loc[:, col_name] = df_copy.loc[:, col_name].astype(dtype={col_name:"int64"})
-                except Exception as error:
-                    raise TypeError("Could not convert {name} column to {dtype}. Detail: {err}".format(name=col_name, dtype=col_type, err=error))
-            elif col_type == "datetime":
-                try:
-                    df_copy.loc[:, col_name] = df_copy.loc[:, col_name].astype(dtype={col_name:"datetime64[s]"})
+                    typed_columns[col_name] = self.cast_column(dataframe.loc[:, col_name], col_type)
                 except Exception as error:
                     raise TypeError("Could not convert {name} column to {dtype}. Detail: {err}".format(name=col_name, dtype=col_type, err=error))
 
-        return df_copy
+        return pd.DataFrame(typed_columns, index=dataframe.index, copy=False)
+
+    def cast_column(self, column, col_type):
+        if col_type == "text":
+            if column.hasnans:
+                column = column.fillna("")
+            return column.astype("object", copy=False)
+        elif col_type == "categoric":
+            return column.astype("category", copy=False)
+        elif col_type == "numeric":
+            return self.downcast_numeric(pd.to_numeric(column))
+        elif col_type == "datetime":
+            return self.parse_datetime(column)
+        return column
+
+    def downcast_numeric(self, column):
+        if pd.api.types.is_integer_dtype(column):
+            return pd.to_numeric(column, downcast="integer")
+        values = column.to_numpy(dtype="float64")
+        if not column.hasnans and np.all(np.mod(values, 1) == 0):
+            return pd.to_numeric(column, downcast="integer")
+        # float32 halves the memory but only when no value loses precision.
+        values_32 = values.astype("float32")
+        if np.array_equal(values_32.astype("float64"), values, equal_nan=True):
+            return pd.Series(values_32, index=column.index, name=column.name)
+        return column
+
+    def parse_datetime(self, column):
+        if pd.api.types.is_datetime64_any_dtype(column):
+            return column
+        if pd.api.types.is_numeric_dtype(column):
+            # Numeric datetime columns are unix timestamps in seconds, as astype("datetime64[s]") used to read them.
+            return pd.to_datetime(column, unit="s")
+        # Guessing the format from the first value lets pandas parse the whole column with one strptime pattern.
+        # The guess belongs to this column only, the same column name in another upload may use another format.
+        # Strings that start with the year are ISO-like and month first, day first is only for the others.
+        datetime_format, dayfirst = None, True
+        first_valid = column.first_valid_index()
+        if first_valid is not None:
+            sample = str(column.loc[first_valid]).strip()
+            dayfirst = YEAR_FIRST.match(sample) is None
+            datetime_format = "ISO8601" if ISO_DATE.match(sample) else guess_datetime_format(sample, dayfirst=dayfirst)
+        if datetime_format is not None:
+            try:
+                return pd.to_datetime(column, format=datetime_format)
+            except (ValueError, TypeError):
+                pass
+        return pd.to_datetime(column, dayfirst=dayfirst)
+
+    def required_columns(self, graph_types_list, user_selected_types):
+        # Column names the requested graphs refer to. Correlation uses every numeric column.
+        columns = set()
+        for graph in graph_types_list:
+            for key, value in graph.items():
+                if key != "type" and isinstance(value, str):
+                    columns.add(value)
+                elif key != "type" and isinstance(value, list):
+                    columns.update(item for item in value if isinstance(item, str))
+            if graph.get("type") == "correlation":
+                columns.update(name for name, col_type in user_selected_types.get("types").items() if col_type == "numeric")
+        return columns
+
+    def select_columns(self, dataframe, is_selected):
+        # select_dtypes copies the blocks, building the frame from the column Series shares their buffers.
+        selected = {name: dataframe.loc[:, name] for name, dtype in dataframe.dtypes.items() if is_selected(dtype)}
+        return pd.DataFrame(selected, index=dataframe.index, copy=False)
+
+    def read_sample(self, file_path, sample_rows=500, sheet_name=None):
+        # Only the header row and the first sample_rows rows are parsed, so this costs the same for any file size.
+        if file_format(file_path) == "xls":
+            sample = pd.read_excel(file_path, sheet_name=0 if sheet_name is None else sheet_name, nrows=sample_rows)
+            return sample.set_axis([str(column) for column in sample.columns], axis=1)
+        chunks = iter_chunks(file_path, sheet_name, sample_rows)
+        try:
+            return next(chunks).infer_objects()
+        finally:
+            chunks.close()
+
+    def suggest_datatypes(self, sample, parse_ratio=0.9, max_categories=50):
+        suggested_types = {}
+        for col_name in sample.columns:
+            column = sample.loc[:, col_name].dropna()
+            if column.empty:
+                suggested_types[col_name] = "text"
+                continue
+            n_unique = column.nunique()
+            is_low_cardinality = n_unique <= max_categories and n_unique <= 0.5 * len(column)
+            if pd.api.types.is_datetime64_any_dtype(column):
+                suggested_types[col_name] = "datetime"
+            elif pd.api.types.is_bool_dtype(column):
+                suggested_types[col_name] = "categoric"
+            elif pd.api.types.is_numeric_dtype(column) or pd.to_numeric(column, errors="coerce").notna().mean() >= parse_ratio:
+                suggested_types[col_name] = "categoric" if n_unique <= min(max_categories, 10) else "numeric"
+            elif self.datetime_ratio(column) >= parse_ratio:
+                suggested_types[col_name] = "datetime"
+            elif is_low_cardinality:
+                suggested_types[col_name] = "categoric"
+            else:
+                suggested_types[col_name] = "text"
+        return suggested_types
+
+    def datetime_ratio(self, column):
+        # Share of the values pandas reads as datetimes. Text columns have no format to infer, pandas would warn
+        # about every one of them before parsing it value by value.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            return pd.to_datetime(column.astype(str), errors="coerce").notna().mean()
+
+    def check_datatypes(self, sample, user_selected_types):
+        errors = {}
+        for col_name, col_type in user_selected_types.get("types").items():
+            if col_name not in sample.columns:
+                errors[col_name] = "Column {name} is not in the file.".format(name=col_name)
+                continue
+            try:
+                self.cast_column(sample.loc[:, col_name].dropna(), col_type)
+            except Exception as error:
+                errors[col_name] = "Could not convert {name} column to {dtype}. Detail: {err}".format(name=col_name, dtype=col_type, err=error)
+        return errors
 
     def process_categorical(self, dataframe): 
-        df_categoric = dataframe.select_dtypes(include=["category"]).copy()
+        df_categoric = self.select_columns(dataframe, lambda dtype: isinstance(dtype, pd.CategoricalDtype))
         return df_categoric
 
     def process_numeric(self, dataframe):
-        df_numeric = dataframe.select_dtypes(include=["number"]).copy()
+        df_numeric = self.select_columns(dataframe, lambda dtype: pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype))
         return df_numeric
     
     def process_datetime(self, dataframe):
         # datetime format should be "day/month/year".
-        df_datetime = dataframe.select_dtypes(include=["datetime"]).copy()
+        df_datetime = self.select_columns(dataframe, pd.api.types.is_datetime64_any_dtype)
         # if not df_datetime.columns.empty:
         #     df_datetime = df_datetime.apply(lambda column: column.dt.strftime("%d/%m/%Y"))
         # dataframe = dataframe.sort_values(by=list(date_time)[0])
@@ -77,19 +233,17 @@ class ProcessData():
         # df_datetime = df.select_dtypes(include=["datetime"])
         return df_datetime
 
-    def process_text(self, dataframe):
-        df_text = dataframe.select_dtypes(include=["object"]).copy()
-        text_dict = df_text.apply(lambda text: " ".join(text.values)).to_dict()
-        text_dict_processed = {}
-        for label, text in text_dict.items():
-            text = self.make_lowercase(text)
-            text = self.remove_puncts(text)
-            text = self.remove_stopwords(text)
-            text = self.remove_numbers(text)
-            # text = self.stem_words(text)
-            text_dict_processed.update({label:text})
+    def process_text(self, dataframe, columns=None, language=None, stem=False):
+        # Returns the normalized rows of each text column. Only the columns that a wordcloud asks for are processed.
+        # The stopword set and stemmer are picked per column from its detected language unless one is given.
+        df_text = self.select_columns(dataframe, pd.api.types.is_object_dtype)
+        text_processed_by_cols = {}
+        for label in df_text.columns:
+            if columns is not None and label not in columns:
+                continue
+            text_processed_by_cols[label] = self.text_processor().process_column(df_text.loc[:, label], language, stem)
 
-        return text_dict_processed
+        return text_processed_by_cols
 
     def make_lowercase(self, text):
         return text.lower()
@@ -97,36 +251,34 @@ class ProcessData():
     def remove_puncts(self, text):
         return text.translate(text.maketrans("", "", punctuation))
     
-    def remove_stopwords(self, text, language="turkish"):
+    def remove_stopwords(self, text, language=None):
         tokens = self.tokenize_text(text)
-        if language == 'turkish':
-            stopwords = self._stopwords_tr
-        elif language == 'english':
-            stopwords = self._stopwords_en
+        if language is None:
+            language = self.text_processor().detect_language([text])
+        stopwords = self.stopwords(language)
         stopwords_removed = " ".join([token for token in tokens if token not in stopwords])
         return stopwords_removed
     
     def remove_numbers(self, text):
-        regex = RegexpTokenizer(r'[^\d\s\n]+')
-        numbers_removed = " ".join(regex.tokenize(text))
+        from nltk import RegexpTokenizer
+        numbers_removed = " ".join(RegexpTokenizer(r'[^\d\s\n]+').tokenize(text))
         return numbers_removed
 
-    def stem_words(self, text, language="turkish"):
-        tokens = self.tokenize_text(text)
-        if language == "turkish":
-            stemmed_text = " ".join(self._stemmer_tr.stemWords(tokens))
-        elif language == "english":
-            stemmed_text = " ".join([self._stemmer_en.stem(token) for token in tokens])
+    def stem_words(self, text, language=None):
+        if language is None:
+            language = self.text_processor().detect_language([text])
+        stemmed_text = self.text_processor().stem_rows([text], language)[0]
         return stemmed_text
     
     def tokenize_text(self, text):
+        from nltk import word_tokenize
         return word_tokenize(text)
         
     def read_stopwords(self, stopwords_file):
         with open(stopwords_file, encoding="utf-8") as stopwords:
             stopwords_list = stopwords.readlines()
-        stopwords_list = [stopword.strip() for stopword in stopwords_list]
-        return stopwords_list
+        stopwords_set = frozenset(stopword.strip() for stopword in stopwords_list)
+        return stopwords_set
 
     # def freq_dist(self, text):
     #     counter = CountVectorizer(ngram_range=(1,2), max_features=100)
@@ -0,0 +1,116 @@
+import re, os, threading
+from functools import partial
+from string import punctuation
+from concurrent.futures import ProcessPoolExecutor
+
+
+PUNCTUATION_REGEX = re.compile("[{0}]".format(re.escape(punctuation)))
+# Numbers split tokens the same way RegexpTokenizer(r'[^\d\s\n]+') did in ProcessData.remove_numbers.
+NUMBERS_REGEX = re.compile(r"\d+")
+
+_worker_stopwords = {}
+
+
+def normalize_rows(rows, stopwords=None, language=None):
+    # Lowercasing, punctuation and number removal run once over the whole batch, rows are split back on a NUL separator.
+    if stopwords is None:
+        stopwords = _worker_stopwords.get(language, frozenset())
+    if not rows:
+        return []
+    batch = NUMBERS_REGEX.sub(" ", PUNCTUATION_REGEX.sub("", "\x00".join(rows).lower()))
+    processed_rows = []
+    for row in batch.split("\x00"):
+        processed_rows.append(" ".join([token for token in row.split() if token not in stopwords]))
+    return processed_rows
+
+
+def _init_worker(stopwords_by_language):
+    global _worker_stopwords
+    _worker_stopwords = stopwords_by_language
+
+
+class ProcessText():
+    # Lowercasing, punctuation, number and stopword removal in one tokenize-and-filter pass per row.
+    # Large columns are split into batches and spread over a process pool. Stemming runs once per distinct
+    # token and the results are cached, the vocabulary is tiny next to the number of token occurrences.
+    def __init__(self, stopwords_by_language, stemmers=None, default_language="turkish", batch_size=5000, parallel_threshold=50000, max_workers=None, stem_cache_size=200000):
+        self._stopwords = {language: frozenset(stopwords) for language, stopwords in stopwords_by_language.items()}
+        self._stemmers = stemmers or {}
+        self._default_language = default_language
+        self._batch_size = batch_size
+        self._parallel_threshold = parallel_threshold
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._stem_cache_size = stem_cache_size
+        self._stem_cache = {language: {} for language in self._stemmers}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def process_column(self, column, language=None, stem=False):
+        rows = column.dropna().astype(str).to_list()
+        if language is None:
+            language = self.detect_language(rows)
+        if len(rows) < self._parallel_threshold or self._max_workers < 2:
+            processed_rows = normalize_rows(rows, self._stopwords.get(language, frozenset()))
+        else:
+            processed_rows = []
+            for processed_batch in self.pool().map(partial(normalize_rows, language=language), self.iter_batches(rows)):
+                processed_rows.extend(processed_batch)
+        if stem:
+            processed_rows = self.stem_rows(processed_rows, language)
+        return processed_rows
+
+    def detect_language(self, rows, sample_size=1000, min_ratio=0.02):
+        # The language whose stopwords make up the largest share of the sampled tokens wins.
+        tokens = normalize_rows(rows[:sample_size], frozenset())
+        tokens = " ".join(tokens).split()
+        if not tokens:
+            return self._default_language
+        hit_ratios = {language: sum(token in stopwords for token in tokens) / len(tokens) for language, stopwords in self._stopwords.items()}
+        language = max(hit_ratios, key=hit_ratios.get)
+        if hit_ratios.get(language) < min_ratio:
+            return self._default_language
+        return language
+
+    def stem_rows(self, rows, language):
+        rows_tokens = [row.split() for row in rows]
+        stems = self.stem_tokens({token for tokens in rows_tokens for token in tokens}, language)
+        return [" ".join([stems.get(token) for token in tokens]) for tokens in rows_tokens]
+
+    def stem_tokens(self, tokens, language):
+        stemmer = self._stemmers.get(language)
+        if stemmer is None:
+            return {token: token for token in tokens}
+        # Requests stem at the same time: every call collects its stems in its own dict and only then
+        # publishes the new ones. A full cache is replaced, not cleared under a call still reading it.
+        cache = self._stem_cache.get(language)
+        stems, missing = {}, []
+        for token in tokens:
+            stem = cache.get(token)
+            if stem is None:
+                missing.append(token)
+            else:
+                stems[token] = stem
+        if missing:
+            new_stems = dict(zip(missing, stemmer(missing)))
+            stems.update(new_stems)
+            if len(cache) + len(new_stems) > self._stem_cache_size:
+                self._stem_cache[language] = new_stems
+            else:
+                cache.update(new_stems)
+        return stems
+
+    def iter_batches(self, rows):
+        for start in range(0, len(rows), self._batch_size):
+            yield rows[start:start + self._batch_size]
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self._max_workers, initializer=_init_worker, initargs=(self._stopwords,))
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -0,0 +1,106 @@
+import numpy as np
+
+
+BOX_QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+class QuantileSketch():
+    # KLL sketch: level h holds items standing for 2**h values each, and a full level is sorted and every
+    # other item promoted to the next one. Memory stays around 3k items whatever the input size. The rank
+    # error is about 1.65% at k=200 (99% confidence) and shrinks as 1/k. Sketches of chunks merge.
+    def __init__(self, k=200, seed=0):
+        self._k = k
+        self._rng = np.random.default_rng(seed)
+        self._compactors = [np.empty(0)]
+        self._n = 0
+
+    @property
+    def rank_error(self):
+        return 3.3 / self._k
+
+    @property
+    def count(self):
+        return self._n
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        self._n += values.size
+        # Feeding the values in slices keeps every sort small, the whole input is never sorted at once.
+        for start in range(0, values.size, 8 * self._k):
+            self._compactors[0] = np.concatenate([self._compactors[0], values[start:start + 8 * self._k]])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self._compactors) < len(other._compactors):
+            self._compactors.append(np.empty(0))
+        for level, items in enumerate(other._compactors):
+            self._compactors[level] = np.concatenate([self._compactors[level], items])
+        self._n += other._n
+        self._compress()
+        return self
+
+    def quantile(self, quantiles):
+        items = np.concatenate(self._compactors)
+        if items.size == 0:
+            return np.full(len(quantiles), np.nan)
+        weights = np.concatenate([np.full(len(level_items), 2.0 ** level) for level, level_items in enumerate(self._compactors)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        ranks = np.asarray(quantiles) * cumulative[-1]
+        return items[np.minimum(np.searchsorted(cumulative, ranks, side="left"), items.size - 1)]
+
+    def _capacity(self, level):
+        depth = len(self._compactors) - level - 1
+        return max(2, int(np.ceil(self._k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self._compactors):
+            items = self._compactors[level]
+            if items.size > self._capacity(level):
+                if level + 1 == len(self._compactors):
+                    self._compactors.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays on this level so no weight is lost.
+                if items.size % 2:
+                    items, kept = items[:-1], items[-1:]
+                else:
+                    kept = np.empty(0)
+                promoted = items[self._rng.integers(2)::2]
+                self._compactors[level] = kept
+                self._compactors[level + 1] = np.concatenate([self._compactors[level + 1], promoted])
+            level += 1
+
+
+def box_statistics(values, approximate=False, whisker=1.5, max_outliers=500):
+    # [low whisker, Q1, median, Q3, high whisker] per column of a 2-D array and the values beyond the
+    # Tukey fences. Exact quantiles partition every column at once, approximate ones come from a sketch.
+    values = np.asarray(values, dtype="float64")
+    if values.ndim == 1:
+        values = values[:, None]
+    if approximate:
+        quantiles = np.column_stack([QuantileSketch().update(values[:, column]).quantile(BOX_QUANTILES) for column in range(values.shape[1])])
+    else:
+        with np.errstate(all="ignore"):
+            quantiles = np.nanquantile(values, BOX_QUANTILES, axis=0) if values.size else np.full((5, values.shape[1]), np.nan)
+    q1, median, q3 = quantiles[1], quantiles[2], quantiles[3]
+    low_fence, high_fence = q1 - whisker * (q3 - q1), q3 + whisker * (q3 - q1)
+    inside = (values >= low_fence) & (values <= high_fence)
+    with np.errstate(all="ignore"):
+        low = np.where(inside, values, np.inf).min(axis=0) if values.size else quantiles[0]
+        high = np.where(inside, values, -np.inf).max(axis=0) if values.size else quantiles[4]
+    boxes = np.column_stack([low, q1, median, q3, high])
+    boxes[~np.isfinite(boxes)] = np.nan
+
+    outliers = []
+    outside = ~inside & ~np.isnan(values)
+    for column in range(values.shape[1]):
+        column_outliers = values[outside[:, column], column]
+        if column_outliers.size > max_outliers:
+            # Keep the most extreme ones, measured by distance from the median.
+            distance = np.abs(column_outliers - median[column])
+            column_outliers = column_outliers[np.argpartition(distance, -max_outliers)[-max_outliers:]]
+        outliers.append(np.unique(column_outliers))
+    return boxes, outliers
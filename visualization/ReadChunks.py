@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+from visualization.Histogram import value_statistics
+
+
+CHUNK_ROWS = 50000
+FILE_FORMATS = ((".csv.gz", "csv"), (".csv", "csv"), (".parquet", "parquet"), (".xlsx", "xlsx"), (".xlsm", "xlsx"), (".xls", "xls"))
+
+
+def file_format(file_path):
+    name = str(file_path).lower()
+    for suffix, format_name in FILE_FORMATS:
+        if name.endswith(suffix):
+            return format_name
+    raise ValueError("Unsupported file format: {0}".format(file_path))
+
+
+def sheet_names(file_path):
+    # Worksheet names of a workbook, an empty list for csv and parquet files.
+    format_name = file_format(file_path)
+    if format_name == "xlsx":
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+    if format_name == "xls":
+        return pd.ExcelFile(file_path).sheet_names
+    return []
+
+
+def column_names(header):
+    # Header cells as the excel reader names them: "Unnamed: i" for empty cells, ".1", ".2" after repeated names.
+    names, seen = [], {}
+    for position, name in enumerate(header):
+        name = "Unnamed: {0}".format(position) if name is None else str(name)
+        if name in seen:
+            seen[name] += 1
+            name = "{0}.{1}".format(name, seen[name])
+        seen.setdefault(name, 0)
+        names.append(name)
+    return names
+
+
+def iter_chunks(file_path, sheet_name=None, chunk_rows=CHUNK_ROWS):
+    # Frames of at most chunk_rows rows, in file order, with string column names. A file without rows still
+    # gives one empty frame with its columns. sheet_name picks the worksheet of a workbook, the first one by default.
+    format_name = file_format(file_path)
+    if format_name == "xlsx":
+        chunks = iter_xlsx_chunks(file_path, sheet_name, chunk_rows)
+    elif format_name == "xls":
+        chunks = iter_xls_chunks(file_path, sheet_name, chunk_rows)
+    elif format_name == "csv":
+        chunks = iter_csv_chunks(file_path, chunk_rows)
+    else:
+        chunks = iter_parquet_chunks(file_path, chunk_rows)
+    empty, has_rows = None, False
+    for chunk in chunks:
+        chunk.columns = [str(column) for column in chunk.columns]
+        if len(chunk):
+            has_rows = True
+            yield chunk
+        elif empty is None:
+            empty = chunk
+    if not has_rows and empty is not None:
+        yield empty
+
+
+def iter_xlsx_chunks(file_path, sheet_name=None, chunk_rows=CHUNK_ROWS):
+    # openpyxl's read-only mode streams the sheet xml, only one chunk of cell values is held at a time.
+    # Blank rows are kept like the excel reader keeps them, except the trailing ones.
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if sheet_name is None:
+            worksheet = workbook.worksheets[0]
+        elif sheet_name in workbook.sheetnames:
+            worksheet = workbook[sheet_name]
+        else:
+            raise ValueError("Worksheet {0} not found, the workbook has {1}".format(sheet_name, ", ".join(workbook.sheetnames)))
+        rows = worksheet.iter_rows(values_only=True)
+        columns = column_names(next(rows, ()))
+        width = len(columns)
+        chunk, blank_rows = [], 0
+        for row in rows:
+            if all(value is None for value in row):
+                blank_rows += 1
+                continue
+            chunk.extend([(None,) * width] * blank_rows)
+            blank_rows = 0
+            chunk.append(row[:width] if len(row) >= width else row + (None,) * (width - len(row)))
+            while len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk[:chunk_rows], columns=columns).infer_objects()
+                chunk = chunk[chunk_rows:]
+        yield pd.DataFrame(chunk, columns=columns).infer_objects()
+    finally:
+        workbook.close()
+
+
+def iter_xls_chunks(file_path, sheet_name=None, chunk_rows=CHUNK_ROWS):
+    # xlrd has no streaming mode, but an xls sheet stops at 65536 rows.
+    dataframe = pd.read_excel(file_path, sheet_name=0 if sheet_name is None else sheet_name)
+    for start in range(0, max(len(dataframe), 1), chunk_rows):
+        yield dataframe.iloc[start:start + chunk_rows]
+
+
+def iter_csv_chunks(file_path, chunk_rows=CHUNK_ROWS):
+    # Plain or gzip compressed, the compression is taken from the file name.
+    with pd.read_csv(file_path, chunksize=chunk_rows, compression="infer") as reader:
+        yield from reader
+
+
+def iter_parquet_chunks(file_path, chunk_rows=CHUNK_ROWS):
+    from pyarrow import parquet
+    parquet_file = parquet.ParquetFile(file_path)
+    yield parquet_file.schema_arrow.empty_table().to_pandas()
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+class TypedChunks():
+    # The typed rows of a stored dataset chunk by chunk, for intermediates that are folded over the rows
+    # instead of computed on the whole typed frame. Only one chunk of the requested columns is in memory.
+    def __init__(self, process, file_path, user_selected_types, columns=None, chunk_rows=CHUNK_ROWS):
+        self._process = process
+        self._file_path = file_path
+        self._types = user_selected_types
+        self._columns = columns
+        self._chunk_rows = chunk_rows
+        self.rows = process.dataset_rows(file_path, user_selected_types.get("sheet_name"))
+
+    def __iter__(self):
+        return self.iter()
+
+    def iter(self, start=0, columns=None, chunk_rows=None):
+        # Typed chunks of the rows from start on.
+        columns = self._columns if columns is None else [column for column in columns if self._columns is None or column in self._columns]
+        for chunk in self._process.read_chunks(self._file_path, self._types.get("sheet_name"), columns, chunk_rows or self._chunk_rows, start):
+            yield self._process.cast_datatypes(chunk, self._types, columns)
+
+    def head(self, head_rows=1000):
+        # An empty typed frame with the dtypes of the first rows, enough to plan the graphs.
+        chunks = self.iter(chunk_rows=head_rows)
+        try:
+            return next(chunks).iloc[:0]
+        finally:
+            chunks.close()
+
+    def value_statistics(self, column):
+        # (min, max, count, standard deviation) of a numeric column over all rows, see Histogram.value_statistics.
+        return value_statistics(chunk.loc[:, column].to_numpy(dtype="float64", na_value=np.nan) for chunk in self.iter(0, [column]))
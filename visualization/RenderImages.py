@@ -0,0 +1,159 @@
+import hashlib, json, os, threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from visualization import Metrics
+from visualization.CategoryAggregates import AGGREGATIONS
+from visualization.DiskQuota import DiskQuota
+
+
+IMAGE_FORMATS = ("png", "pdf")
+RENDERING_DIR = ".rendering"
+
+_worker = {}
+
+
+def _init_worker():
+    # Agg renders without a display, every worker keeps one ProcessData and one VisualizeData (and its figure).
+    import matplotlib
+    matplotlib.use("Agg")
+    from visualization.ProcessData import ProcessData
+    from visualization.VisualizeData import VisualizeData
+    _worker["process"] = ProcessData()
+    _worker["visualizer"] = VisualizeData()
+
+
+def render_batch(file_path, user_file_and_types, items):
+    # Renders [(graph, image_file)] from one read of the dataset. The feather store is memory-mapped and
+    # uncompressed, a worker only copies the columns its graphs use into its frame. Returns one flag per item,
+    # False for graphs that do not fit the columns.
+    process, visualizer = _worker.get("process"), _worker.get("visualizer")
+    graphs = [graph for graph, _ in items]
+    columns = process.required_columns(graphs, user_file_and_types)
+    df = process.read_file(file_path, user_file_and_types.get("sheet_name"), columns)
+    df_typed = process.cast_datatypes(df, user_file_and_types, columns)
+    frames = {"typed": df_typed, "categoric": process.process_categorical(df_typed), "numeric": process.process_numeric(df_typed), "datetime": process.process_datetime(df_typed)}
+    rendered = []
+    for graph, image_file in items:
+        # Renders in progress live in a subdirectory, where neither evict() nor invalidate() looks.
+        tmp_file = Path(image_file).parent / RENDERING_DIR / "{0}_{1}".format(os.getpid(), Path(image_file).name)
+        tmp_file.parent.mkdir(exist_ok=True)
+        try:
+            is_rendered = plot_graph(visualizer, frames, graph, tmp_file)
+            if is_rendered:
+                os.replace(tmp_file, image_file)
+        finally:
+            tmp_file.unlink(missing_ok=True)
+        rendered.append(is_rendered)
+    return rendered
+
+
+def plot_graph(visualizer, frames, graph, image_file):
+    # Reads the graph spec field by field like PlanGraphs.plan_graph, with the same defaults, so an image
+    # shows the chart the json spec describes.
+    categoric, numeric, datetime = (frames.get(name).columns for name in ("categoric", "numeric", "datetime"))
+    graph_type = graph.get("type")
+    if graph_type == "pieplot" and graph.get("categoric_col_name") in categoric:
+        visualizer.plot_pie(frames.get("categoric"), graph.get("categoric_col_name"), graph.get("top_k", 20), image_file)
+    elif graph_type == "barplot" and graph.get("categoric_col_name", graph.get("x")) in categoric:
+        cat_col, num_col = graph.get("categoric_col_name", graph.get("x")), graph.get("numeric_col_name")
+        aggregations = graph.get("aggregations") or [graph.get("aggregation", "mean")]
+        if num_col in numeric and all(aggregation in AGGREGATIONS for aggregation in aggregations):
+            visualizer.plot_bar(frames.get("typed"), cat_col, num_col, aggregations[0], graph.get("top_k", 50), image_file)
+        elif not num_col:
+            visualizer.plot_bar(frames.get("categoric"), cat_col, top_k=graph.get("top_k", 50), image_file=image_file)
+        else:
+            return False
+    elif graph_type == "scatterplot" and graph.get("num_col_name_1") in numeric and graph.get("num_col_name_2") in numeric:
+        visualizer.plot_scatter(frames.get("numeric"), graph.get("num_col_name_1"), graph.get("num_col_name_2"), image_file)
+    elif graph_type == "histogram" and graph.get("x") in numeric:
+        bins = tuple(graph.get("bins")) if isinstance(graph.get("bins"), list) else graph.get("bins", "fd")
+        visualizer.plot_histogram(frames.get("numeric"), graph.get("x"), bins, graph.get("density", False), graph.get("kde", False), image_file)
+    elif graph_type == "boxplot":
+        box_columns = [graph.get("x")] if isinstance(graph.get("x"), str) else graph.get("x") or []
+        group_by = graph.get("group_by")
+        if not box_columns or any(column not in numeric for column in box_columns) or group_by is not None and group_by not in categoric:
+            return False
+        visualizer.plot_boxplot(frames.get("typed"), box_columns, group_by, image_file)
+    elif graph_type == "timeplot" and graph.get("x") in datetime:
+        y1, y2 = graph.get("y", graph.get("y1", -1)), graph.get("y2", -1)
+        if y1 == -1 and y2 == -1 or any(y != -1 and y not in numeric for y in (y1, y2)):
+            return False
+        visualizer.plot_time(frames.get("typed").sort_values(graph.get("x")), graph.get("x"), y1, y2, image_file)
+    elif graph_type == "correlation":
+        correlation_columns = [column for column in graph.get("columns", numeric) if column in numeric]
+        if len(correlation_columns) < 2:
+            return False
+        visualizer.plot_correlation(frames.get("numeric"), correlation_columns, graph.get("method", "pearson"), image_file)
+    else:
+        return False
+    return True
+
+
+class RenderImages():
+    # Static export of the charts as png or pdf files. Renders run on a process pool with the Agg backend,
+    # the graphs of one request are split into one batch per worker. Images are cached on disk by dataset
+    # content hash, column types, graph spec and format, the web process only hands out file paths.
+    def __init__(self, process, cache_dir, max_workers=None, max_disk_bytes=512 * 1024 * 1024):
+        self._process = process
+        self._cache_dir = Path(cache_dir)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._quota = DiskQuota(self._cache_dir, tuple(".{0}".format(image_format) for image_format in IMAGE_FORMATS), max_disk_bytes)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def key(self, dataset_hash, column_types, graph, image_format="png"):
+        spec = json.dumps({"types": column_types, "graph": graph, "format": image_format}, sort_keys=True, default=str)
+        return "{0}_{1}".format(dataset_hash, hashlib.sha256(spec.encode("utf8")).hexdigest()[:32])
+
+    def image_path(self, key, image_format="png"):
+        return self._cache_dir / "{0}.{1}".format(key, image_format)
+
+    def render(self, file_path, user_file_and_types, graph_types_list, image_format="png"):
+        # Returns one image path per graph, None for graphs that do not fit the columns.
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError("Unknown image format {0}".format(image_format))
+        dataset_hash = self._process.dataset_hash(file_path, user_file_and_types.get("sheet_name"))
+        keys = [self.key(dataset_hash, user_file_and_types.get("types"), graph, image_format) for graph in graph_types_list]
+        missing = [index for index, key in enumerate(keys) if not self.image_path(key, image_format).exists()]
+        for index in range(len(keys)):
+            Metrics.count_lookup("image_cache", "miss" if index in missing else "hit")
+        if missing:
+            batches = [missing[start::self._max_workers] for start in range(min(self._max_workers, len(missing)))]
+            with Metrics.timed("render_images", image_format):
+                futures = [self.pool().submit(render_batch, file_path, user_file_and_types, [(graph_types_list[index], self.image_path(keys[index], image_format)) for index in batch]) for batch in batches]
+                for future in futures:
+                    future.result()
+        images, rendered_size = [], 0
+        for index, key in enumerate(keys):
+            image_path = self.image_path(key, image_format)
+            try:
+                os.utime(image_path)
+                if index in missing:
+                    rendered_size += image_path.stat().st_size
+                images.append(image_path)
+            except FileNotFoundError:
+                images.append(None)
+        if missing:
+            self._quota.added(rendered_size)
+        return images
+
+    def invalidate(self, dataset_hash):
+        for image_file in self._cache_dir.glob("{0}_*".format(dataset_hash)):
+            image_file.unlink(missing_ok=True)
+
+    def evict(self):
+        self._quota.evict()
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self._max_workers, initializer=_init_worker)
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
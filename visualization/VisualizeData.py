@@ -1,94 +1,179 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-from wordcloud import WordCloud
-from sklearn.feature_extraction.text import CountVectorizer
-from nltk import FreqDist, word_tokenize, RegexpTokenizer, stem
-from snowballstemmer import TurkishStemmer
-
-import time, json
-from string import punctuation
+import json
 from pathlib import Path
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from visualization.CategoryAggregates import CategoryAggregates
+from visualization.FrequencyCounter import FrequencyCounter
+from visualization.Histogram import Histogram
+from visualization.Quantiles import box_statistics
+from visualization.Correlation import correlation_matrix, heatmap_triples
+
+
+TIME_GRANULARITIES = {"hour": "h", "day": "D", "week": "W", "month": "MS"}
 
 
 class VisualizeData():
-    def __init__(self):
+    def __init__(self, images_dir=None):
         self._figsize_x = 12
         self._figsize_y = 8
+        self._images_dir = Path(images_dir) if images_dir is not None else None
+        self._figure = None
     
-    def prepare_pieplot(self, df_categorical, column_name):
-        data_pieplot = {column_name:[]}
-        category_counts = df_categorical.loc[:, column_name].value_counts().to_dict()
-        for category, value in category_counts.items():
-            data_pieplot.get(column_name).append({"name": category, "y": value})
+    def prepare_pieplot(self, df_categorical, column_name, counts=None, top_k=20):
+        # Columnar payload: parallel "names" and "values" arrays instead of one {"name", "y"} dict per category.
+        # Past top_k categories the rest are summed into one "Other" slice, "other" is how many it holds.
+        if counts is None:
+            counts = CategoryAggregates(df_categorical.loc[:, column_name])
+        table = counts.top(("count",), top_k)
+        data_pieplot = {"name": column_name, "names": table.get("names"), "values": table.get("count"), "other": table.get("other")}
         return data_pieplot
     
-    def prepare_barplot(self, dataframe, cat_col, num_col=None):
+    def prepare_barplot(self, dataframe, cat_col, num_col=None, counts=None, aggregates=None, aggregations=("mean",), top_k=50):
+        # "values" holds the first aggregation, every requested one (count, sum, mean, median) is also under its
+        # own name. The top_k most frequent categories are kept in category order, the rest go into "Other".
         if not num_col:
-            return self.prepare_pieplot(dataframe, cat_col)
+            return self.prepare_pieplot(dataframe, cat_col, counts, top_k)
         else:
             title = "{categoric} vs {numeric}".format(categoric=cat_col, numeric=num_col)
-            data_barplot = {title:[]}
-            cat_and_num = dataframe.loc[:, [cat_col,num_col]].groupby(cat_col).mean().to_dict()
-            for label, value in cat_and_num.get(num_col).items():
-                data_barplot.get(title).append({"name": label, "y": round(value,1)})
+            if aggregates is None:
+                aggregates = CategoryAggregates(dataframe.loc[:, cat_col], dataframe.loc[:, num_col])
+            table = aggregates.top(aggregations, top_k, order="category")
+            data_barplot = {"name": title, "names": table.get("names"), "other": table.get("other")}
+            for aggregation in aggregations:
+                data_barplot[aggregation] = table.get(aggregation) if aggregation == "count" else np.round(table.get(aggregation), 1).tolist()
+            data_barplot["values"] = data_barplot.get(aggregations[0])
             return data_barplot
     
-    def prepare_scatterplot(self, dataframe, num_col_1, num_col_2):
+    def prepare_scatterplot(self, dataframe, num_col_1, num_col_2, max_points=5000, mode="sample", bins=100):
+        # Above max_points the pairs are either sampled ("sample" at random, "stratified" evenly along the x order)
+        # or binned into a bins x bins density grid of [x_center, y_center, count] ("density").
         title = "{0} vs {1}".format(num_col_1, num_col_2)
         data_scatterplot = {}
-        df_copy = dataframe.loc[:, [num_col_1, num_col_2]]
-        num_col_pairs = [[int(num_1),int(num_2)] for num_1, num_2 in df_copy.values]
-        data_scatterplot.update({title: num_col_pairs})
+        values = dataframe.loc[:, [num_col_1, num_col_2]].dropna().to_numpy()
+        n_points = len(values)
+        if n_points <= max_points:
+            mode = "points"
+        elif mode == "density":
+            counts, x_edges, y_edges = np.histogram2d(values[:, 0].astype("float64"), values[:, 1].astype("float64"), bins=bins)
+            x_index, y_index = np.nonzero(counts)
+            x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+            y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+            values = np.column_stack([x_centers[x_index], y_centers[y_index], counts[x_index, y_index]])
+        elif mode == "stratified":
+            order = np.argsort(values[:, 0], kind="stable")
+            values = values[order[np.linspace(0, n_points - 1, max_points).astype("int64")]]
+        else:
+            mode = "sample"
+            rng = np.random.default_rng(0)
+            values = values[np.sort(rng.choice(n_points, size=max_points, replace=False))]
+        data_scatterplot.update({title: values.tolist(), "mode": mode, "total_points": n_points})
         return data_scatterplot
 
-    def prepare_timeplot(self, df, x, y1, y2=None, y3=None):
-        df_copy = df.copy().sort_values(by=[x])
-        x_values = [x_value.strftime("%d/%m/%Y") for x_value in df_copy.loc[:, x].dt.date]
-        data_timeplot = [{"x_axis": x_values},]
-        for numeric_col in [y1 , y2, y3]:
-            if numeric_col:
-                data_timeplot.append({"name": numeric_col, "data": df_copy.loc[:,numeric_col].to_list()})
+    def prepare_timeplot(self, df, x, y1, y2=None, y3=None, granularity=None, aggregation="mean", max_points=1000):
+        # x values are sent as epoch milliseconds. Series longer than max_points are resampled to the given
+        # granularity or to the finest one that fits, then reduced with Largest-Triangle-Three-Buckets.
+        numeric_cols = [numeric_col for numeric_col in [y1, y2, y3] if numeric_col]
+        if isinstance(df.index, pd.DatetimeIndex) and df.index.name == x:
+            df_time = df.loc[:, numeric_cols]
+        else:
+            df_time = df.loc[:, [x] + numeric_cols].dropna(subset=[x])
+            df_time.set_index(x, inplace=True)
+        if not df_time.index.is_monotonic_increasing:
+            df_time.sort_index(inplace=True)
+
+        if granularity is None and len(df_time) > max_points:
+            granularity = self.timeplot_granularity(df_time.index, max_points)
+        if granularity in TIME_GRANULARITIES:
+            df_time = df_time.resample(TIME_GRANULARITIES.get(granularity)).agg(aggregation).dropna(how="all")
+
+        x_values = df_time.index.to_numpy(dtype="datetime64[ms]").astype("int64")
+        if len(df_time) > max_points:
+            # Every series keeps its share of max_points, the union of the kept rows never passes it.
+            series_points = max(max_points // max(len(numeric_cols), 1), 3)
+            indices = set()
+            for numeric_col in numeric_cols:
+                y_values = df_time.loc[:, numeric_col].to_numpy(dtype="float64")
+                valid = np.flatnonzero(~np.isnan(y_values))
+                indices.update(valid[lttb_indices(x_values[valid], y_values[valid], series_points)].tolist())
+            df_time = df_time.iloc[sorted(indices)]
+            x_values = df_time.index.to_numpy(dtype="datetime64[ms]").astype("int64")
+
+        data_timeplot = [{"x_axis": x_values.tolist(), "granularity": granularity or "raw", "aggregation": aggregation},]
+        for numeric_col in numeric_cols:
+            y_values = df_time.loc[:, numeric_col]
+            data_timeplot.append({"name": numeric_col, "data": y_values.astype(object).where(y_values.notna(), None).to_list()})
         return data_timeplot
+
+    def timeplot_granularity(self, datetime_index, max_points):
+        span = datetime_index[-1] - datetime_index[0]
+        for granularity, period in [("hour", pd.Timedelta(hours=1)), ("day", pd.Timedelta(days=1)), ("week", pd.Timedelta(weeks=1))]:
+            if span / period <= max_points:
+                return granularity
+        return "month"
     
-    def prepare_boxplot(self, df_numeric, x):
-        data = []
-        x_axis = [x]
-        name = x
-        describe_df = df_numeric.loc[:, x].describe().to_dict()
-        min_df = describe_df.get("min")
-        q_min_df = describe_df.get("25%")
-        median_df = describe_df.get("50%")
-        q_max_df = describe_df.get("75%")
-        max_df = describe_df.get("max")
-        data.append([min_df, q_min_df, median_df, q_max_df, max_df])
+    def prepare_boxplot(self, dataframe, x, group_by=None, approximate=None, max_outliers=500):
+        # x is one numeric column or a list of them. With group_by, every numeric column gets one box per
+        # category of that column. Above a million rows the quantiles come from a KLL sketch.
+        columns = [x] if isinstance(x, str) else list(x)
+        if approximate is None:
+            approximate = len(dataframe) > 1000000
+        if group_by is None:
+            boxes, outliers = box_statistics(dataframe.loc[:, columns].to_numpy(dtype="float64"), approximate, max_outliers=max_outliers)
+            data_outliers = [[index, value] for index, column_outliers in enumerate(outliers) for value in column_outliers.tolist()]
+            series = [{"name": ", ".join(columns), "data": self.box_rows(boxes)}, {"name": "Outliers", "data": data_outliers}]
+            data_boxplot = {"x_axis": columns, "series": series, "approximate": approximate}
+            return data_boxplot
 
-        q_low = df_numeric.loc[:, x].quantile(0.01)
-        q_high = df_numeric.loc[:, x].quantile(0.99)
-        outliers = set(df_numeric[(df_numeric["Age"] > q_high) | (df_numeric["Age"] < q_low)]["Age"])
-        data_outliers = [[0,outlier] for outlier in outliers]
-        
-        data_boxplot = {"x_axis": x_axis, "series": [{"name":name, "data":data},{"name":"Outliers", "data":data_outliers}] }
+        groups = dataframe.loc[:, group_by].astype("category")
+        codes = groups.cat.codes.to_numpy()
+        # Rows without a group (code -1) would sort first and land in the first category's box.
+        grouped = np.flatnonzero(codes >= 0)
+        order = grouped[np.argsort(codes[grouped], kind="stable")]
+        splits = np.searchsorted(codes[order], np.arange(len(groups.cat.categories)))
+        values = dataframe.loc[:, columns].to_numpy(dtype="float64")[order]
+        group_values = np.split(values, splits[1:])
+        group_stats = [box_statistics(values_in_group, approximate, max_outliers=max_outliers) for values_in_group in group_values]
+        series = []
+        for column_index, column in enumerate(columns):
+            boxes = np.vstack([boxes[column_index] for boxes, _ in group_stats])
+            data_outliers = [[group_index, value] for group_index, (_, outliers) in enumerate(group_stats) for value in outliers[column_index].tolist()]
+            series.append({"name": column, "data": self.box_rows(boxes)})
+            series.append({"name": "{0} Outliers".format(column), "data": data_outliers})
+        data_boxplot = {"x_axis": [str(category) for category in groups.cat.categories], "series": series, "approximate": approximate}
         return data_boxplot
 
-    def prepare_correlation(self, df_numeric):
-        data = []
-        corr_matrix = df_numeric.corr()
-        for row in range(0, corr_matrix.shape[0]):
-            for column in range(0, corr_matrix.shape[1]):
-                data.append([row, column, round(corr_matrix.iloc[row, column], 4) ])
+    def box_rows(self, boxes):
+        return [[None if np.isnan(value) else value for value in row] for row in boxes.tolist()]
+
+    def prepare_correlation(self, df_numeric, columns=None, method="pearson", stats=None):
+        # Pearson comes from the given statistics when the caller keeps them (the planner stores them per dataset
+        # and adds appended rows on top), otherwise from the rows.
+        if columns is not None:
+            df_numeric = df_numeric.loc[:, columns]
+        corr_matrix = correlation_matrix(df_numeric, method, stats if method == "pearson" else None)
+        data = heatmap_triples(corr_matrix)
                 
-        data_correlation = {"x_y_axis": df_numeric.columns.to_list(), "series":[{"name": "correlation matrix", "data": data}]}
+        data_correlation = {"x_y_axis": df_numeric.columns.to_list(), "series":[{"name": "correlation matrix", "data": data}], "method": method}
         return data_correlation
 
-    def prepare_histogram(self, df_numeric, x):
-        data_histogram = {"name": x, "data": df_numeric.loc[:, x].to_list()}
+    def prepare_histogram(self, df_numeric, x, bins="fd", density=False, kde=False, histogram=None):
+        # Binned on the server, the payload holds the bin edges and one value per bin instead of every row.
+        if histogram is None:
+            histogram = Histogram.from_values(df_numeric.loc[:, x].to_numpy(dtype="float64"), bins)
+        data_histogram = {"name": x}
+        data_histogram.update(histogram.to_dict(density, kde))
         return data_histogram
 
-    def prepare_wordcloud(self, text_dict, x):
-        word_frequencies = self.freq_dist(text_dict.get(x))
+    def prepare_wordcloud(self, text_dict, x, top_k=100, exact=None, counter=None):
+        if counter is None:
+            counter = self.word_counter(text_dict.get(x), top_k, exact)
+        word_frequencies = {word:count for word, count in counter.most_common(top_k)}
         word_freq_list = []
         data_wordcloud = {}
         for word, freq in word_frequencies.items():
@@ -96,150 +181,175 @@ class VisualizeData():
         data_wordcloud.update({"name": x, "data": word_freq_list})
         return data_wordcloud
 
-    def freq_dist(self, text):
-        counter = CountVectorizer(ngram_range=(1,2), max_features=100)
-        counter_fit = counter.fit_transform([text])
-        counts = np.asarray(counter_fit.sum(axis=0))
-        words = counter.get_feature_names()
-        freq = {}
-        for word, count in zip(words, counts[0]):
-            freq[word] = count
-        freq_sorted = {word:count for word,count in sorted(freq.items(), key=lambda item: item[1], reverse=True)}
+    def word_counter(self, rows, top_k=100, exact=None):
+        # Small columns are counted exactly, large ones go through the bounded Space-Saving counter.
+        if exact is None:
+            exact = len(rows) <= 10000
+        counter = FrequencyCounter(capacity=max(10 * top_k, 1000), ngram_range=(1,2), exact=exact)
+        counter.update(rows)
+        return counter
+
+    def freq_dist(self, rows, top_k=100, exact=False):
+        freq_sorted = {word:count for word, count in self.word_counter(rows, top_k, exact).most_common(top_k)}
         return freq_sorted   
     
-    def plot_bar(self, df_categoric, column):
-        count = df_categoric.loc[:, column].value_counts()
-        names = count.index.values
-        values = count.values
-        top_limit = 50   
-        names_ticks = np.arange(len(names[:top_limit]))
-        top_names = names[:top_limit]
-        top_values = values[:top_limit]
-
-        title = "Top {top_limit} {column} Counts".format(top_limit=top_limit, column=column)
-        fig, ax = plt.subplots(figsize=(self._figsize_x, self._figsize_y))
-        ax.bar(top_names, top_values)
-        ax.set_ylabel('Counts')
-        ax.set_title(title)
-        ax.set_xticks(names_ticks)
-        ax.set_xticklabels(top_names, rotation=90)
+    def figure(self):
+        # One matplotlib Figure per instance, cleared and reused for every render. It is built without pyplot,
+        # so no global figure registry keeps the old ones alive. Each plot_* draws on it, saves, and clears it.
+        from matplotlib.figure import Figure
+        if self._figure is None:
+            self._figure = Figure()
+        self._figure.clear()
+        self._figure.set_size_inches(self._figsize_x, self._figsize_y)
+        return self._figure
 
+    def save_figure(self, fig, name, image_file=None):
         # "\" or "/" characters caused an exception while saving
-        column = column.replace("\\", " ").replace("/", " ")
-        image_file = self._images_dir / "{column}_bar.png".format(column=column)
-        fig.savefig(image_file, bbox_inches="tight")
-    
-    def plot_pie(self, df_categoric, column):
-        df = df_categoric.copy()
-        df.dropna(inplace=True)
-        count = df.loc[:, column].value_counts()
-        names = count.index.values
-        values = count.values
-        top_limit = 20   
-        top_names = names[:top_limit]
-        top_values = values[:top_limit]
+        if image_file is None:
+            image_file = self._images_dir / name.replace("\\", " ").replace("/", " ")
+        try:
+            fig.savefig(image_file, bbox_inches="tight")
+        finally:
+            fig.clear()
+        return image_file
 
-        title = "Top {top_limit} {column} Ratio".format(top_limit=top_limit, column=column)
-        fig, ax = plt.subplots(figsize=(self._figsize_x, self._figsize_y))
+    def plot_bar(self, df, cat_col, num_col=None, aggregation="mean", top_k=50, image_file=None):
+        # Drawn from the prepare_barplot payload, the image shows the same categories and "Other" bar as the json chart.
+        data = self.prepare_barplot(df, cat_col, num_col, aggregations=(aggregation,), top_k=top_k)
+        names = [str(name) for name in data.get("names")]
+        title = data.get("name") if num_col else "Top {top_k} {column} Counts".format(top_k=top_k, column=cat_col)
+        fig = self.figure()
+        ax = fig.subplots()
+        ax.bar(names, data.get("values"))
+        ax.set_ylabel(aggregation.capitalize() if num_col else 'Counts')
+        ax.set_title(title)
+        ax.set_xticks(np.arange(len(names)))
+        ax.set_xticklabels(names, rotation=90)
+        return self.save_figure(fig, "{column}_bar.png".format(column=cat_col), image_file)
+    
+    def plot_pie(self, df_categoric, column, top_k=20, image_file=None):
+        data = self.prepare_pieplot(df_categoric, column, top_k=top_k)
+        title = "Top {top_k} {column} Ratio".format(top_k=top_k, column=column)
+        fig = self.figure()
+        ax = fig.subplots()
         ax.set_title(title)
-        # fig.set_size_inches(figsize_x, figsize_y)
-        wedges, texts, autotexts = ax.pie(top_values, autopct='%1.1f%%')
+        wedges, texts, autotexts = ax.pie(data.get("values"), autopct='%1.1f%%')
         ax.axis('equal')
-        ax.legend(wedges, top_names, title="{0}".format(column), loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
-
-        column = column.replace("\\", " ").replace("/", " ")
-        image_file = self._images_dir / "{column}_pie.png".format(column=column)
-        fig.savefig(image_file, bbox_inches="tight")
+        ax.legend(wedges, [str(name) for name in data.get("names")], title="{0}".format(column), loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
+        return self.save_figure(fig, "{column}_pie.png".format(column=column), image_file)
         
-    def plot_correlation(self, df_numeric):
-        correlation_matrix = df_numeric.corr()
+    def plot_correlation(self, df_numeric, columns=None, method="pearson", image_file=None):
+        import seaborn as sns
+        if columns is not None:
+            df_numeric = df_numeric.loc[:, columns]
         title = "Correlation Matrix"
-        plt.figure(figsize=(self._figsize_x, self._figsize_y))
-        plt.title(title)
-        sns.heatmap(correlation_matrix, annot=True)
-        image_file = Path.joinpath(self._images_dir, "{title}_correlation.png".format(title=title))
-        plt.savefig(image_file, bbox_inches="tight")
-        # plt.ioff()
+        fig = self.figure()
+        ax = fig.subplots()
+        ax.set_title(title)
+        sns.heatmap(correlation_matrix(df_numeric, method), annot=True, ax=ax)
+        return self.save_figure(fig, "{title}_correlation.png".format(title=title), image_file)
     
-    def plot_scatter(self, df_numeric, x, y):
+    def plot_scatter(self, df_numeric, x, y, image_file=None, max_points=100000):
+        # Past max_points a uniform sample is drawn, the png looks the same and the render stays bounded.
+        df_points = df_numeric.loc[:, [x, y]].dropna()
+        if len(df_points) > max_points:
+            df_points = df_points.sample(n=max_points, random_state=0)
         title = "{X} vs {Y}".format(X=x, Y=y)
-        plt.figure(figsize=(self._figsize_x, self._figsize_y))
-        plt.title(title)
-        plt.xlabel(x)
-        plt.ylabel(y)
-        plt.scatter(df_numeric[x], df_numeric[y])
-        name = "{x}_vs_{y}".replace("\\", " ").replace("/", " ")
-        image_file = self._images_dir / "{name}_scatter.png".format(name=name)
-        plt.savefig(image_file, bbox_inches="tight")
+        fig = self.figure()
+        ax = fig.subplots()
+        ax.set_title(title)
+        ax.set_xlabel(x)
+        ax.set_ylabel(y)
+        ax.scatter(df_points[x], df_points[y], rasterized=True)
+        return self.save_figure(fig, "{x}_vs_{y}_scatter.png".format(x=x, y=y), image_file)
     
-    def plot_histogram(self, df_numeric, x, bins=50, density=True):
-        title = "{X} histogram (bins: {bins} kde: {density})".format(X=x, bins=bins, density=density)
-        plt.figure(figsize=(self._figsize_x, self._figsize_y))
-        plt.title(title)
-        plt.ylabel("Frequency")
-        plt.xlabel(x)
-        if density:
-            plt.hist(df_numeric[x], bins=bins, density=density)
-            sns.kdeplot(data=df_numeric, x=x)
-        else:
-            plt.hist(df_numeric[x], bins=bins)
-            
-        name = x.replace("/", " ").replace("\\", " ")
-        image_file = Path.joinpath(self._images_dir, "{name}_histogram.png".format(name=name))
-        plt.savefig(image_file, bbox_inches="tight")
+    def plot_histogram(self, df_numeric, x, bins="fd", density=False, kde=False, image_file=None):
+        # Same bin rule and kde as prepare_histogram, the bars are its bins.
+        data = self.prepare_histogram(df_numeric, x, bins, density, kde)
+        edges = np.asarray(data.get("bins"))
+        title = "{X} histogram (bins: {bins} kde: {kde})".format(X=x, bins=len(edges) - 1, kde=kde)
+        fig = self.figure()
+        ax = fig.subplots()
+        ax.set_title(title)
+        ax.set_ylabel("Density" if density else "Frequency")
+        ax.set_xlabel(x)
+        ax.stairs(data.get("data"), edges, fill=True)
+        if kde:
+            kde_ax = ax if density else ax.twinx()
+            kde_ax.plot(data.get("kde").get("x"), data.get("kde").get("y"), color="orange")
+        return self.save_figure(fig, "{name}_histogram.png".format(name=x), image_file)
 
-    def plot_boxplot(self, df, x, y):
-        fig, ax = plt.subplots(figsize=(self._figsize_x, self._figsize_y))
-        if y != -1:
-            title = "Distribution of {x} vs {y}".format(x=x, y=y)
-            sns.boxplot(ax=ax, x=x, y=y, data=df)
-            ax.set_title(title)
-            ax.set_xlabel(x)
-            ax.set_xticklabels(ax.get_xticklabels(), rotation=90)
-            name = "{x}_vs_{y}".format(x=x, y=y).replace("/", " ").replace("\\", " ")
+    def plot_boxplot(self, df, x, group_by=None, image_file=None):
+        # Drawn from the prepare_boxplot statistics: one box per column, or per category of group_by and column,
+        # with the same whiskers and outliers as the json chart.
+        data = self.prepare_boxplot(df, x, group_by)
+        series = data.get("series")
+        pairs = [(series[index], series[index + 1]) for index in range(0, len(series), 2)]
+        width = 0.8 / len(pairs)
+        fig = self.figure()
+        ax = fig.subplots()
+        for pair_index, (boxes, outliers) in enumerate(pairs):
+            fliers = [[] for _ in boxes.get("data")]
+            for position, value in outliers.get("data"):
+                fliers[position].append(value)
+            offset = (pair_index - (len(pairs) - 1) / 2) * width
+            stats, positions = [], []
+            for position, box in enumerate(boxes.get("data")):
+                if box[2] is None:
+                    continue
+                stats.append({"whislo": box[0], "q1": box[1], "med": box[2], "q3": box[3], "whishi": box[4], "fliers": fliers[position]})
+                positions.append(position + offset)
+            if stats:
+                ax.bxp(stats, positions=positions, widths=width * 0.9, patch_artist=True, boxprops={"facecolor": "C{0}".format(pair_index)})
+        columns = [x] if isinstance(x, str) else list(x)
+        ax.set_xticks(np.arange(len(data.get("x_axis"))))
+        ax.set_xticklabels(data.get("x_axis"), rotation=90 if group_by else 0)
+        if group_by:
+            title = "Distribution of {x} by {group_by}".format(x=", ".join(columns), group_by=group_by)
+            ax.set_xlabel(group_by)
+            if len(pairs) > 1:
+                from matplotlib.patches import Patch
+                ax.legend([Patch(facecolor="C{0}".format(index)) for index in range(len(pairs))], columns)
+            name = "{x}_by_{group_by}".format(x="_".join(columns), group_by=group_by)
         else:
-            title = "Distribution of {x}".format(x=x)
-            sns.boxplot(ax=ax, x=x, data=df)
-            ax.set_title(title)
-            name = "{x}".format(x=x).replace("/", " ").replace("\\", " ")
-        
-        image_file = self._images_dir / "{name}_boxplot.png".format(name=name)
-        fig.savefig(image_file, bbox_inches="tight")
+            title = "Distribution of {x}".format(x=", ".join(columns))
+            name = "_".join(columns)
+        ax.set_title(title)
+        return self.save_figure(fig, "{name}_boxplot.png".format(name=name), image_file)
 
-    def plot_time(self, df, x, y1, y2):
-        fig, ax = plt.subplots(figsize=(self._figsize_x, self._figsize_y))
+    def plot_time(self, df, x, y1, y2, image_file=None):
+        # Axes.plot_date is deprecated, plot with the same marker and solid line draws the same chart.
+        fig = self.figure()
+        ax = fig.subplots()
         if y1 != -1 and y2 !=-1:
             title = "{y1}_{y2} vs {x}".format(y1=y1, y2=y2, x=x)
             ax2 = ax.twinx()
-            p1 = ax.plot_date(df.loc[:, x], df.loc[:, y1], linestyle='solid', color="blue", label=y1)
-            p2 = ax2.plot_date(df.loc[:, x], df.loc[:, y2], linestyle='solid', color="orange", label=y2)
+            p1 = ax.plot(df.loc[:, x], df.loc[:, y1], marker="o", linestyle='solid', color="blue", label=y1)
+            p2 = ax2.plot(df.loc[:, x], df.loc[:, y2], marker="o", linestyle='solid', color="orange", label=y2)
             ax.set_ylabel(y1)
             ax2.set_ylabel(y2)
             ax.set_title(title)
             ax.legend((p1[0], p2[0]),(p1[0].get_label(), p2[0].get_label()))
-            name = "{y1}_{y2}_vs_{x}".format(y1=y1, y2=y2, x=x).replace("/", " ").replace("\\", " ")
+            name = "{y1}_{y2}_vs_{x}".format(y1=y1, y2=y2, x=x)
             
         elif y1 != -1:
             title = "{y1} vs {x}".format(y1=y1, x=x)
-            p1 = ax.plot_date(df.loc[:, x], df.loc[:, y1], linestyle='solid', color="blue", label=y1)
+            ax.plot(df.loc[:, x], df.loc[:, y1], marker="o", linestyle='solid', color="blue", label=y1)
             ax.set_ylabel(y1)
             ax.set_title(title)
-            ax.legend(p1[0].get_label())
-            name = "{y1}_vs_{x}".format(y1=y1, x=x).replace("/", " ").replace("\\", " ")
+            ax.legend()
+            name = "{y1}_vs_{x}".format(y1=y1, x=x)
 
         elif y2 != -1:
             title = "{y2} vs {x}".format(y2=y2, x=x)
-            ax2 = ax.twinx()
-            p2 = ax.plot_date(df.loc[:, x], df.loc[:, y2], linestyle='solid', color="blue", label=y2)
+            ax.plot(df.loc[:, x], df.loc[:, y2], marker="o", linestyle='solid', color="blue", label=y2)
             ax.set_ylabel(y2)
             ax.set_title(title)
-            ax.legend(p2[0].get_label())
-            name = "{y2}_vs_{x}".format(y2=y2, x=x).replace("/", " ").replace("\\", " ")    
+            ax.legend()
+            name = "{y2}_vs_{x}".format(y2=y2, x=x)
         
         fig.autofmt_xdate()
-        
-        image_file = self._images_dir / "{name}_timeseries.png".format(name=name)
-        fig.savefig(image_file, bbox_inches="tight")
+        return self.save_figure(fig, "{name}_timeseries.png".format(name=name), image_file)
 
 
         # for name in df_numeric.columns.to_list():
@@ -289,6 +399,35 @@ class VisualizeData():
     #         plt.ioff()
         
         
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, from every bucket in between,
+    # the point that forms the largest triangle with the previously kept point and the next bucket's mean.
+    n_points = len(x)
+    if n_out >= n_points or n_out < 3:
+        return np.arange(n_points)
+    x = x.astype("float64")
+    edges = np.linspace(1, n_points - 1, n_out - 1).astype("int64")
+    indices = np.empty(n_out, dtype="int64")
+    indices[0], indices[-1] = 0, n_points - 1
+    kept = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+        next_start, next_end = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (n_points - 1, n_points)
+        next_end = max(next_end, next_start + 1)
+        mean_x, mean_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs((x[kept] - mean_x) * (y[start:end] - y[kept]) - (x[kept] - x[start:end]) * (mean_y - y[kept]))
+        kept = start + int(np.argmax(areas))
+        indices[bucket + 1] = kept
+    return np.unique(indices)
+
+
+def encode_json(data):
+    # orjson is several times faster than the json module when it is installed.
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, separators=(",", ":")).encode("utf8")
+
+
 def save_as_json(data_list, json_files_dir, file_name):
     with open( json_files_dir / "{0}.json".format(file_name), "w+", encoding="utf8") as file:
         json.dump(data_list, file, sort_keys=False, indent=None)    
\ No newline at end of file